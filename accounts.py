@@ -0,0 +1,63 @@
+from datetime import datetime
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from app import db
+from models import User, UserRole
+from dashboard import mark_dashboard_stale
+
+# Dialects whose INSERT supports ON CONFLICT ... DO UPDATE ... RETURNING
+_UPSERT_INSERTS = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}
+
+# Set once this process has seen a user row; from then on sign-ups no longer
+# carry the first-user-becomes-admin check. Users are never all deleted, so
+# the flag never needs to go back.
+_bootstrapped = False
+
+LOGIN_USER_COLUMNS = (User.id, User.username, User.email, User.first_name, User.last_name,
+                      User.is_admin, User.role, User.created_at)
+
+
+def _first_user_is_admin():
+    """is_admin for a new sign-up: NOT EXISTS (SELECT ... FROM user) until bootstrapped
+
+    Evaluated inside the INSERT itself, so it costs no extra round trip.
+    """
+    if _bootstrapped:
+        return False
+    return ~db.select(User.id).exists()
+
+
+def _login_upsert(values, conflict_column, updated_columns):
+    insert = _UPSERT_INSERTS[db.engine.dialect.name](User).values(**values)
+    set_ = {name: insert.excluded[name]
+            for name in (*updated_columns, 'first_name', 'last_name', 'last_login')}
+    return insert.on_conflict_do_update(index_elements=[conflict_column], set_=set_) \
+        .returning(*LOGIN_USER_COLUMNS) \
+        .execution_options(affects_dashboard=False)
+
+
+def upsert_login_user(username, email, first_name, last_name, now=None):
+    """Create or update the signing-in user with one INSERT ... ON CONFLICT
+
+    An account with the same email takes the new username; failing that, an
+    account with the same username takes the new email. Names and last_login
+    are always refreshed, and role and is_admin are never touched on
+    existing accounts. Returns (row, created) in the caller's transaction.
+    """
+    global _bootstrapped
+    now = now or datetime.utcnow()
+    values = dict(username=username, email=email, first_name=first_name, last_name=last_name,
+                  role=UserRole.MENTEE, is_admin=_first_user_is_admin(), created_at=now, last_login=now)
+    try:
+        row = db.session.execute(_login_upsert(values, User.email, ('username',))).one()
+    except IntegrityError:
+        # The username belongs to an account with another email
+        db.session.rollback()
+        row = db.session.execute(_login_upsert(values, User.username, ('email',))).one()
+
+    _bootstrapped = True
+    # created_at is only written by the INSERT branch of the upsert
+    created = row.created_at == now
+    if created:
+        mark_dashboard_stale(db.session)
+    return row, created
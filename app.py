@@ -24,6 +24,23 @@ app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
     "pool_recycle": 300,
     "pool_pre_ping": True,
 }
+# Upper bound on how long the navigation page index can miss another worker's edits
+app.config["NAV_CACHE_TTL"] = float(os.environ.get("NAV_CACHE_TTL", "60"))
+# Seconds a user's set of active match partners may be served from the process cache
+app.config["MATCH_CACHE_TTL"] = float(os.environ.get("MATCH_CACHE_TTL", "30"))
+# Seconds the admin dashboard counts may be served from the process cache
+app.config["DASHBOARD_CACHE_TTL"] = float(os.environ.get("DASHBOARD_CACHE_TTL", "30"))
+# Keep rendered page HTML in the rendered_page table as well as in memory
+app.config["PAGE_RENDER_PERSIST"] = os.environ.get("PAGE_RENDER_PERSIST", "1") != "0"
+# Write user change logs from a background thread instead of inside the request
+app.config["AUDIT_ASYNC"] = os.environ.get("AUDIT_ASYNC", "0") == "1"
+# Change log batches the background writer may hold before requests write inline
+app.config["AUDIT_QUEUE_SIZE"] = int(os.environ.get("AUDIT_QUEUE_SIZE", "1000"))
+# Seconds an unchanged session record's data stays in the process cache; its
+# version is still checked against the store on every request
+app.config["SESSION_CACHE_TTL"] = float(os.environ.get("SESSION_CACHE_TTL", "300"))
+# Session records kept in the process cache
+app.config["SESSION_CACHE_SIZE"] = int(os.environ.get("SESSION_CACHE_SIZE", "10000"))
 # initialize the app with the extension, flask-sqlalchemy >= 3.0.x
 db.init_app(app)
 
@@ -35,3 +52,6 @@ with app.app_context():
     
     # Import routes after app is configured
     import routes  # noqa: F401
+    
+    # Register flask CLI commands
+    import commands  # noqa: F401
@@ -0,0 +1,205 @@
+import atexit
+import enum
+import logging
+import queue
+import threading
+from datetime import datetime
+from sqlalchemy import MetaData, Table, inspect
+from sqlalchemy.orm import joinedload
+from app import app, db
+from models import UserChangeLog
+
+logger = logging.getLogger(__name__)
+
+# User attributes recorded in UserChangeLog when an admin edits them
+AUDITED_USER_FIELDS = ('first_name', 'last_name', 'email', 'role', 'is_admin')
+
+
+def _audit_value(value):
+    """Stored text for an attribute value: enums by value, everything else by str"""
+    if value is None:
+        return None
+    if isinstance(value, enum.Enum):
+        return value.value
+    return str(value)
+
+
+def diff_changes(obj, fields):
+    """[(field, old, new)] for fields assigned since obj was loaded
+
+    Read from SQLAlchemy attribute history, so call it after setting the new
+    values and before flushing. Assignments that don't change the stored
+    text are ignored.
+    """
+    state = inspect(obj)
+    changes = []
+    for name in fields:
+        history = state.attrs[name].history
+        if not history.added:
+            continue
+        old = _audit_value(history.deleted[0]) if history.deleted else None
+        new = _audit_value(history.added[0])
+        if old != new:
+            changes.append((name, old, new))
+    return changes
+
+
+def change_log_rows(user_id, actor_id, changes, when=None):
+    """UserChangeLog insert parameters for a list of (field, old, new)"""
+    when = when or datetime.utcnow()
+    return [
+        {'user_id': user_id, 'field_changed': field, 'old_value': old, 'new_value': new,
+         'updated_by': actor_id, 'updated_at': when}
+        for field, old, new in changes
+    ]
+
+
+def insert_change_logs(rows):
+    """Add change log rows to the current transaction with one INSERT"""
+    if rows:
+        db.session.execute(db.insert(UserChangeLog), rows)
+
+
+class AuditWriter:
+    """Writes change log rows on a background thread through a bounded queue
+
+    enqueue() never waits on the database. If the queue is full the rows
+    are written synchronously instead, so audit records are never dropped.
+    """
+
+    def __init__(self, maxsize=1000, batch_size=500):
+        self.batch_size = batch_size
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._app = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self, app):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._app = app
+                self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+                self._thread.start()
+
+    def enqueue(self, app, rows):
+        """Queue committed change rows for writing; returns False if written inline"""
+        if not rows:
+            return True
+        self._ensure_started(app)
+        try:
+            self._queue.put_nowait(rows)
+            return True
+        except queue.Full:
+            logger.warning('Audit queue full; writing %d change log row(s) inline', len(rows))
+            insert_change_logs(rows)
+            db.session.commit()
+            return False
+
+    def _run(self):
+        while True:
+            batch = self._queue.get()
+            taken = 1
+            # Coalesce whatever else is waiting into one INSERT
+            while len(batch) < self.batch_size:
+                try:
+                    batch = batch + self._queue.get_nowait()
+                    taken += 1
+                except queue.Empty:
+                    break
+            try:
+                with self._app.app_context():
+                    insert_change_logs(batch)
+                    db.session.commit()
+            except Exception:
+                logger.exception('Failed to write %d change log row(s)', len(batch))
+            finally:
+                for _ in range(taken):
+                    self._queue.task_done()
+
+    def flush(self):
+        """Block until every queued row has been written"""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.join()
+
+
+def history_query(user_id=None, actor_id=None):
+    """Change log entries for a user and/or by an admin, with both users eager-loaded
+
+    Each filter is served by its (column, updated_at, id) index, so keyset
+    pages on (updated_at, id) stay range scans.
+    """
+    query = UserChangeLog.query.options(joinedload(UserChangeLog.user), joinedload(UserChangeLog.updated_by_user))
+    if user_id is not None:
+        query = query.filter(UserChangeLog.user_id == user_id)
+    if actor_id is not None:
+        query = query.filter(UserChangeLog.updated_by == actor_id)
+    return query
+
+
+def change_to_dict(log):
+    """JSON shape of one change log entry for the audit API"""
+    return {
+        'id': log.id,
+        'user': {'id': log.user_id, 'username': log.user.username if log.user else None},
+        'field': log.field_changed,
+        'old_value': log.old_value,
+        'new_value': log.new_value,
+        'updated_by': {'id': log.updated_by,
+                       'username': log.updated_by_user.username if log.updated_by_user else None},
+        'updated_at': log.updated_at.isoformat(),
+    }
+
+
+# Monthly archive tables are created on demand and never managed by create_all
+_archive_metadata = MetaData()
+
+
+def archive_table(year, month):
+    """user_change_log_archive_YYYY_MM, with the hot table's columns and no foreign keys"""
+    name = f'{UserChangeLog.__table__.name}_archive_{year:04d}_{month:02d}'
+    table = _archive_metadata.tables.get(name)
+    if table is None:
+        table = Table(name, _archive_metadata,
+                      *[db.Column(column.name, column.type, primary_key=column.primary_key,
+                                  nullable=column.nullable, autoincrement=False)
+                        for column in UserChangeLog.__table__.columns])
+    table.create(db.engine, checkfirst=True)
+    return table
+
+
+def _next_month(moment):
+    return datetime(moment.year + moment.month // 12, moment.month % 12 + 1, 1)
+
+
+def archive_change_logs(cutoff, progress=None):
+    """Move entries older than cutoff into monthly archive tables
+
+    Works one calendar month at a time: copy with INSERT ... SELECT, delete
+    the same range, commit. Returns {table_name: rows_moved}.
+    """
+    hot = UserChangeLog.__table__
+    oldest = db.session.execute(db.select(db.func.min(hot.c.updated_at)).where(hot.c.updated_at < cutoff)).scalar()
+    moved = {}
+    if oldest is None:
+        return moved
+
+    month_start = datetime(oldest.year, oldest.month, 1)
+    while month_start < cutoff:
+        month_end = min(_next_month(month_start), cutoff)
+        in_range = db.and_(hot.c.updated_at >= month_start, hot.c.updated_at < month_end)
+        archive = archive_table(month_start.year, month_start.month)
+        columns = [hot.c[column.name] for column in archive.columns]
+        db.session.execute(archive.insert().from_select([column.name for column in archive.columns],
+                                                        db.select(*columns).where(in_range)))
+        count = db.session.execute(hot.delete().where(in_range)).rowcount
+        db.session.commit()
+        if count:
+            moved[archive.name] = count
+            if progress:
+                progress(archive.name, count)
+        month_start = _next_month(month_start)
+    return moved
+
+
+audit_writer = AuditWriter(maxsize=app.config['AUDIT_QUEUE_SIZE'])
+atexit.register(audit_writer.flush)
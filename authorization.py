@@ -0,0 +1,98 @@
+from models import Form, ViewerScope, UserRole, scope_allows
+from matches import matched_ids
+from navigation import nav_index
+
+# One bit per viewer scope
+SCOPE_BITS = {scope: 1 << i for i, scope in enumerate(ViewerScope)}
+
+# Scopes that depend on the viewer's active matches
+MATCH_SCOPES = (ViewerScope.MATCHED_PAIR, ViewerScope.MENTOR_OF, ViewerScope.MENTEE_OF)
+MATCH_SCOPE_MASK = sum(SCOPE_BITS[scope] for scope in MATCH_SCOPES)
+
+# Scopes that cannot be decided from role and admin flag alone
+DYNAMIC_SCOPES = MATCH_SCOPES + (ViewerScope.SELF_ONLY,)
+
+# Scopes granted by role and admin flag alone: the (role, is_admin, scope)
+# lookup table, precomputed at import as one bitmask per combination
+ROLE_SCOPE_MASKS = {
+    (role, is_admin): sum(SCOPE_BITS[scope] for scope in ViewerScope if scope_allows(scope, role, is_admin))
+    for role in UserRole for is_admin in (False, True)
+}
+
+
+def match_scope_mask(user_id):
+    """Bits for the match scopes user_id satisfies
+
+    MATCHED_PAIR pages are for anyone in an active match, MENTOR_OF pages for
+    users mentoring someone, and MENTEE_OF pages for users who have a mentor.
+    """
+    ids = matched_ids(user_id)
+    mask = 0
+    if ids:
+        mask |= SCOPE_BITS[ViewerScope.MATCHED_PAIR]
+    if ids.mentee_ids:
+        mask |= SCOPE_BITS[ViewerScope.MENTOR_OF]
+    if ids.mentor_ids:
+        mask |= SCOPE_BITS[ViewerScope.MENTEE_OF]
+    return mask
+
+
+def scope_permits(role, is_admin, scope):
+    """Table lookup for scopes decidable from role and admin flag alone"""
+    return bool(ROLE_SCOPE_MASKS[(role, bool(is_admin))] & SCOPE_BITS[scope])
+
+
+def role_scopes(role, is_admin):
+    """Scopes granted by role alone, for pushing the check into SQL"""
+    mask = ROLE_SCOPE_MASKS[(role, bool(is_admin))]
+    return [scope for scope in ViewerScope if mask & SCOPE_BITS[scope]]
+
+
+def filter_visible(viewer, rows):
+    """Filter Page or Form rows down to those viewer may see, in one pass
+
+    Rows need viewer_scope and created_by_id. Role scopes are a bitmask
+    test. Match scopes cost at most one match query per batch, and none
+    while the viewer's partner set is cached. SELF_ONLY rows are visible to
+    the user who created them.
+    """
+    rows = list(rows)
+    mask = ROLE_SCOPE_MASKS[(viewer.role, bool(viewer.is_admin))]
+    if any(SCOPE_BITS[row.viewer_scope] & MATCH_SCOPE_MASK for row in rows):
+        mask |= match_scope_mask(viewer.id)
+
+    self_bit = SCOPE_BITS[ViewerScope.SELF_ONLY]
+    return [
+        row for row in rows
+        if mask & SCOPE_BITS[row.viewer_scope]
+        or (SCOPE_BITS[row.viewer_scope] == self_bit and row.created_by_id == viewer.id)
+    ]
+
+
+def can_view(viewer, row):
+    """Check a single Page or Form; see filter_visible"""
+    return bool(filter_visible(viewer, [row]))
+
+
+def available_forms(viewer):
+    """Active forms viewer may fill in, newest first"""
+    scopes = role_scopes(viewer.role, viewer.is_admin) + list(DYNAMIC_SCOPES)
+    forms = Form.query.filter(Form.is_active.is_(True), Form.viewer_scope.in_(scopes)) \
+        .order_by(Form.created_at.desc()).all()
+    return filter_visible(viewer, forms)
+
+
+def navigation_pages(viewer):
+    """Published pages for viewer's navigation menu
+
+    The role-based menu is a cached lookup; pages in match or self scopes are
+    checked as one batch, and only when such pages exist.
+    """
+    pages = nav_index.pages_for(viewer.role, viewer.is_admin)
+    dynamic = [page for scope in DYNAMIC_SCOPES for page in nav_index.pages_in_scope(scope)]
+    if not dynamic:
+        return pages
+    extra = filter_visible(viewer, dynamic)
+    if not extra:
+        return pages
+    return tuple(sorted(pages + tuple(extra), key=lambda page: page.id))
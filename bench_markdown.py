@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for page content rendering
+
+Compares the pooled Markdown engine in rendering.process_content with the
+previous implementation, which built a new engine and compiled the color
+pattern on every call.
+
+Usage:
+    python bench_markdown.py [--repeat N]
+"""
+
+import argparse
+import re
+import sys
+import timeit
+import markdown
+
+sys.path.append('.')
+from rendering import process_content
+
+
+def legacy_process_content(content):
+    """process_content as it was before the engine pool"""
+    md = markdown.Markdown(extensions=['fenced_code', 'tables', 'nl2br'])
+    html = md.convert(content)
+    color_pattern = r'<span\s+style="color:\s*((?:#[0-9a-fA-F]{3,6})|(?:rgb\([^)]+\))|(?:[a-zA-Z]+))"\s*>'
+    html = re.sub(color_pattern, r'<span style="color: \1">', html)
+    return html
+
+
+SECTION = """## Getting started
+
+Welcome to the **mentorship program**! Please read the *whole* guide and
+reach out to your [mentor](https://example.com/mentors) early.
+<span style="color: #ff6600">Sessions start next week.</span>
+
+| Week | Topic | Owner |
+|------|-------|-------|
+| 1 | Goals | Mentee |
+| 2 | Career map | Mentor |
+
+```python
+def hello():
+    return "world"
+```
+
+- First item
+- Second item
+  with a continuation line
+
+"""
+
+
+def make_body(size):
+    """Repeat a representative section until the body reaches size bytes"""
+    repeats = size // len(SECTION) + 1
+    return (SECTION * repeats)[:size]
+
+
+def run(repeat):
+    print(f"{'size':>8} {'legacy ms':>12} {'pooled ms':>12} {'speedup':>8}")
+    for label, size, number in (('1 KB', 1024, 200), ('50 KB', 50 * 1024, 5), ('500 KB', 500 * 1024, 1)):
+        body = make_body(size)
+        assert process_content(body) == legacy_process_content(body)
+
+        legacy = min(timeit.repeat(lambda: legacy_process_content(body), number=number, repeat=repeat)) / number
+        pooled = min(timeit.repeat(lambda: process_content(body), number=number, repeat=repeat)) / number
+        print(f"{label:>8} {legacy * 1000:>12.3f} {pooled * 1000:>12.3f} {legacy / pooled:>7.2f}x")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=3, help='timing rounds per size (best is reported)')
+    args = parser.parse_args()
+    run(args.repeat)
@@ -0,0 +1,152 @@
+import csv
+import json
+import time
+from datetime import datetime
+from app import db
+from models import User, UserRole, UserChangeLog
+
+USER_FIELDS = ('username', 'email', 'first_name', 'last_name')
+
+
+class ImportStats:
+    """Running totals for an import"""
+
+    __slots__ = ('read', 'inserted', 'duplicates', 'invalid', 'started_at')
+
+    def __init__(self):
+        self.read = 0
+        self.inserted = 0
+        self.duplicates = 0
+        self.invalid = 0
+        self.started_at = time.perf_counter()
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started_at
+
+    @property
+    def rate(self):
+        return self.inserted / self.elapsed if self.elapsed else 0.0
+
+
+def read_records(stream, fmt):
+    """Yield records from a CSV or JSONL text stream without loading it all
+
+    JSONL lines that are not valid JSON are yielded as None so the import
+    counts them as invalid and carries on.
+    """
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+    elif fmt == 'jsonl':
+        for line in stream:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                yield None
+    else:
+        raise ValueError(f'Unsupported import format: {fmt}')
+
+
+def _text(record, name):
+    value = record.get(name)
+    return '' if value is None else str(value).strip()
+
+
+def normalize_user(record):
+    """Clean one record the way login does; returns None if it is unusable"""
+    if not isinstance(record, dict):
+        return None
+    username = _text(record, 'username').lower()
+    email = _text(record, 'email').lower()
+    first_name = _text(record, 'first_name')
+    last_name = _text(record, 'last_name')
+    if not (username and email and first_name and last_name):
+        return None
+    if len(username) > 64 or len(email) > 120 or len(first_name) > 50 or len(last_name) > 50:
+        return None
+
+    try:
+        role = UserRole(_text(record, 'role').lower() or UserRole.MENTEE.value)
+    except ValueError:
+        return None
+
+    return {
+        'username': username,
+        'email': email,
+        'first_name': first_name,
+        'last_name': last_name,
+        'role': role,
+    }
+
+
+def existing_user_keys():
+    """Sets of usernames and emails already taken, streamed from the user table"""
+    usernames, emails = set(), set()
+    rows = db.session.execute(db.select(User.username, User.email).execution_options(yield_per=10000))
+    for username, email in rows:
+        usernames.add(username)
+        emails.add(email)
+    return usernames, emails
+
+
+def _flush_batch(batch, actor_id, source):
+    now = datetime.utcnow()
+    for row in batch:
+        row['created_at'] = now
+        row['is_admin'] = False
+
+    # One multi-row INSERT ... RETURNING per batch gives us ids for the audit rows
+    ids = db.session.execute(db.insert(User).returning(User.id), batch).scalars().all()
+    db.session.execute(db.insert(UserChangeLog), [
+        {
+            'user_id': user_id,
+            'field_changed': 'account',
+            'old_value': None,
+            'new_value': f'imported from {source}',
+            'updated_by': actor_id,
+            'updated_at': now,
+        }
+        for user_id in ids
+    ])
+    db.session.commit()
+    return len(ids)
+
+
+def import_users(stream, fmt, actor_id, source, batch_size=5000, dry_run=False, progress=None):
+    """Import users from a CSV or JSONL stream in batched inserts
+
+    Records whose username or email already exists, in the database or
+    earlier in the file, are skipped. Each batch commits with its
+    UserChangeLog rows; progress(stats) is called after every batch.
+    """
+    stats = ImportStats()
+    usernames, emails = existing_user_keys()
+    batch = []
+
+    for record in read_records(stream, fmt):
+        stats.read += 1
+        user = normalize_user(record)
+        if user is None:
+            stats.invalid += 1
+            continue
+        if user['username'] in usernames or user['email'] in emails:
+            stats.duplicates += 1
+            continue
+        usernames.add(user['username'])
+        emails.add(user['email'])
+        batch.append(user)
+
+        if len(batch) >= batch_size:
+            stats.inserted += len(batch) if dry_run else _flush_batch(batch, actor_id, source)
+            batch = []
+            if progress:
+                progress(stats)
+
+    if batch:
+        stats.inserted += len(batch) if dry_run else _flush_batch(batch, actor_id, source)
+    if progress:
+        progress(stats)
+    return stats
@@ -0,0 +1,293 @@
+from datetime import datetime, timedelta
+import click
+from flask.cli import AppGroup
+from sqlalchemy import func, inspect, text
+from app import app, db
+from models import Form, Submission, SubmissionAnswer, User
+from bulk_import import import_users
+from exports import EXPORT_FORMATS, stream_export
+from form_stats import forms_without_stats, rebuild_form_stats
+from audit import archive_change_logs
+from matching import apply_plan, form_by_slug, plan_assignment, plan_from_pairs, read_pairs
+from sessions import session_store
+
+forms_cli = AppGroup('forms', help='Application form maintenance.')
+schema_cli = AppGroup('schema', help='Bring an existing database up to the current models.')
+users_cli = AppGroup('users', help='User administration.')
+matches_cli = AppGroup('matches', help='Bulk mentor/mentee matching.')
+audit_cli = AppGroup('audit', help='User change log maintenance.')
+sessions_cli = AppGroup('sessions', help='Server-side session maintenance.')
+
+
+def add_missing_columns(model, *column_names):
+    """Add columns that db.create_all() cannot add to an existing table
+
+    With no column_names, every model column missing from the table is added.
+    """
+    table = model.__table__
+    existing = {column['name'] for column in inspect(db.engine).get_columns(table.name)}
+    preparer = db.engine.dialect.identifier_preparer
+    added = []
+    for name in column_names or table.c.keys():
+        if name in existing:
+            continue
+        column = table.c[name]
+        column_type = column.type.compile(dialect=db.engine.dialect)
+        default = f" DEFAULT {column.server_default.arg}" if column.server_default is not None else ''
+        nullable = '' if column.nullable else ' NOT NULL'
+        db.session.execute(text(
+            f'ALTER TABLE {preparer.quote(table.name)} ADD COLUMN '
+            f'{preparer.quote(name)} {column_type}{default}{nullable}'
+        ))
+        added.append(name)
+    db.session.commit()
+    return added
+
+
+def create_missing_indexes():
+    """Create model indexes that db.create_all() skips on existing tables"""
+    inspector = inspect(db.engine)
+    created = []
+    for table in db.metadata.sorted_tables:
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(db.engine)
+                created.append(index.name)
+    return created
+
+
+def reconcile_submission_counts():
+    """Recompute Form.submission_count from the submission table"""
+    actual = db.select(func.count(Submission.id)) \
+        .where(Submission.form_id == Form.id) \
+        .scalar_subquery()
+    result = db.session.execute(
+        db.update(Form)
+        .where(Form.submission_count != actual)
+        .values(submission_count=actual, updated_at=Form.updated_at)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return result.rowcount
+
+
+@forms_cli.command('reconcile-counts')
+def reconcile_counts_command():
+    """Recompute denormalized submission counts."""
+    added = add_missing_columns(Form, 'submission_count')
+    if added:
+        click.echo(f"Added column(s) to form: {', '.join(added)}")
+    fixed = reconcile_submission_counts()
+    click.echo(f"Corrected submission_count on {fixed} form(s).")
+
+
+def backfill_submission_answers(batch_size=2000, progress=None):
+    """Write SubmissionAnswer rows for submissions that have none
+
+    Walks submissions in id order one batch at a time and commits per
+    batch, so it can be interrupted and re-run.
+    """
+    has_answers = db.select(SubmissionAnswer.id) \
+        .where(SubmissionAnswer.submission_id == Submission.id).exists()
+    last_id, scanned, written = 0, 0, 0
+    while True:
+        batch = db.session.execute(
+            db.select(Submission.id, Submission.form_id, Submission.responses)
+            .where(Submission.id > last_id, ~has_answers)
+            .order_by(Submission.id)
+            .limit(batch_size)
+        ).all()
+        if not batch:
+            return scanned, written
+        rows = [row for submission_id, form_id, responses in batch
+                for row in SubmissionAnswer.rows_for(submission_id, form_id, responses)]
+        if rows:
+            db.session.execute(db.insert(SubmissionAnswer), rows)
+        db.session.commit()
+        last_id = batch[-1][0]
+        scanned += len(batch)
+        written += len(rows)
+        if progress:
+            progress(scanned, written)
+
+
+@forms_cli.command('backfill-answers')
+@click.option('--batch-size', default=2000, show_default=True, help='Submissions per transaction.')
+def backfill_answers_command(batch_size):
+    """Fill the submission answer index for existing submissions."""
+    db.create_all()
+    scanned, written = backfill_submission_answers(
+        batch_size, progress=lambda scanned, written: click.echo(f"{scanned} submission(s), {written} answer(s)"))
+    click.echo(f"Indexed {written} answer(s) from {scanned} submission(s).")
+
+
+@forms_cli.command('rebuild-stats')
+@click.argument('slug', required=False)
+def rebuild_stats_command(slug):
+    """Recompute per-field statistics for one form, or all forms."""
+    db.create_all()
+    query = Form.query.order_by(Form.id)
+    if slug:
+        query = query.filter_by(slug=slug)
+    forms = query.all()
+    if slug and not forms:
+        raise click.UsageError(f'No form with slug {slug!r}.')
+    for form in forms:
+        row = rebuild_form_stats(form)
+        db.session.commit()
+        click.echo(f"{form.slug}: {row.stats.get('submissions', 0)} submission(s)")
+
+
+@forms_cli.command('export')
+@click.argument('slug')
+@click.option('--format', 'fmt', type=click.Choice(list(EXPORT_FORMATS)), default='csv', show_default=True)
+@click.option('--output', '-o', type=click.File('w', encoding='utf-8'), default='-',
+              help='File to write (default: stdout).')
+@click.option('--chunk-size', default=1000, show_default=True, help='Rows fetched per round trip.')
+def export_submissions_command(slug, fmt, output, chunk_size):
+    """Stream a form's submissions as CSV or JSONL."""
+    form = Form.query.filter_by(slug=slug).first()
+    if form is None:
+        raise click.UsageError(f'No form with slug {slug!r}.')
+    for chunk in stream_export(form, fmt, chunk_size=chunk_size):
+        output.write(chunk)
+
+
+@schema_cli.command('sync')
+def sync_schema_command():
+    """Create missing tables, columns and indexes."""
+    db.create_all()
+    for mapper in db.Model.registry.mappers:
+        added = add_missing_columns(mapper.class_)
+        if added:
+            click.echo(f"Added column(s) to {mapper.class_.__table__.name}: {', '.join(added)}")
+        if mapper.class_ is Form and 'submission_count' in added:
+            # The column arrives as DEFAULT 0; existing forms need their real counts
+            fixed = reconcile_submission_counts()
+            click.echo(f"Corrected submission_count on {fixed} form(s).")
+    for name in create_missing_indexes():
+        click.echo(f"Created index {name}")
+    for form in forms_without_stats():
+        row = rebuild_form_stats(form)
+        db.session.commit()
+        click.echo(f"Built statistics for {form.slug}: {row.stats.get('submissions', 0)} submission(s)")
+
+
+def resolve_actor(username):
+    """Admin recorded as updated_by in change logs written by a command"""
+    query = User.query.filter_by(is_admin=True)
+    if username:
+        query = query.filter_by(username=username.strip().lower())
+    actor = query.order_by(User.id).first()
+    if actor is None:
+        raise click.UsageError(f'No admin user {username!r}.' if username else 'No admin user exists yet.')
+    return actor
+
+
+@users_cli.command('import')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']),
+              help='File format; guessed from the extension by default.')
+@click.option('--by', 'actor_username', help='Admin username recorded in the change log (default: first admin).')
+@click.option('--batch-size', default=5000, show_default=True, help='Users per INSERT batch.')
+@click.option('--dry-run', is_flag=True, help='Validate and deduplicate without writing.')
+def import_users_command(path, fmt, actor_username, batch_size, dry_run):
+    """Bulk-create users from a CSV or JSONL file.
+
+    Columns: username, email, first_name, last_name and optional role
+    (mentee, mentor or both). Existing usernames and emails are skipped.
+    """
+    if fmt is None:
+        fmt = 'csv' if path.lower().endswith('.csv') else 'jsonl'
+    actor = resolve_actor(actor_username)
+
+    def report(stats):
+        click.echo(f"{stats.read} read, {stats.inserted} {'valid' if dry_run else 'inserted'}, "
+                   f"{stats.duplicates} duplicate, {stats.invalid} invalid "
+                   f"({stats.rate:,.0f} users/s)")
+
+    with open(path, newline='', encoding='utf-8') as stream:
+        stats = import_users(stream, fmt, actor.id, source=path, batch_size=batch_size,
+                             dry_run=dry_run, progress=report)
+    click.echo(f"Done in {stats.elapsed:.1f}s{' (dry run, nothing written)' if dry_run else ''}.")
+
+
+def report_plan(plan, dry_run):
+    """Echo a match plan's outcome and per-phase timings; writes nothing"""
+    for mentor, mentee, reason in plan.rejected[:20]:
+        click.echo(f"Skipped {mentor or '-'} -> {mentee}: {reason}")
+    if len(plan.rejected) > 20:
+        click.echo(f"... and {len(plan.rejected) - 20} more skipped")
+    timings = ', '.join(f"{phase} {seconds:.2f}s" for phase, seconds in plan.timings.items())
+    click.echo(f"{len(plan.pairs)} match(es) {'planned' if dry_run else 'created'}, "
+               f"{len(plan.rejected)} skipped ({timings})"
+               f"{' (dry run, nothing written)' if dry_run else ''}.")
+
+
+@matches_cli.command('import')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']),
+              help='File format; guessed from the extension by default.')
+@click.option('--dry-run', is_flag=True, help='Validate pairs without writing.')
+def import_matches_command(path, fmt, dry_run):
+    """Create matches from a pairing file.
+
+    Each row has a mentor and a mentee column holding a username or email.
+    Unknown users, wrong roles and existing active matches are skipped.
+    """
+    if fmt is None:
+        fmt = 'csv' if path.lower().endswith('.csv') else 'jsonl'
+    with open(path, newline='', encoding='utf-8') as stream:
+        plan = plan_from_pairs(read_pairs(stream, fmt))
+    if not dry_run:
+        apply_plan(plan)
+    report_plan(plan, dry_run)
+
+
+@matches_cli.command('assign')
+@click.option('--capacity', default=3, show_default=True, help='Most active mentees per mentor.')
+@click.option('--mentor-form', help='Slug of the form mentors filled in.')
+@click.option('--mentee-form', help='Slug of the form mentees filled in.')
+@click.option('--top-k', default=25, show_default=True, help='Candidate mentors ranked per mentee.')
+@click.option('--dry-run', is_flag=True, help='Compute the assignment without writing.')
+def assign_matches_command(capacity, mentor_form, mentee_form, top_k, dry_run):
+    """Match every unmatched mentee to a mentor with spare capacity.
+
+    With both forms given, mentors are ranked by answers shared with the
+    mentee on the choice fields the two forms have in common (vectorized
+    when numpy is installed).
+    """
+    forms = {}
+    for option, slug in (('--mentor-form', mentor_form), ('--mentee-form', mentee_form)):
+        forms[option] = form_by_slug(slug)
+        if slug and forms[option] is None:
+            raise click.UsageError(f'No form with slug {slug!r} for {option}.')
+    plan = plan_assignment(capacity, forms['--mentor-form'], forms['--mentee-form'], top_k=top_k)
+    if not dry_run:
+        apply_plan(plan)
+    report_plan(plan, dry_run)
+
+
+@audit_cli.command('compact')
+@click.option('--older-than', 'days', default=365, show_default=True,
+              help='Archive entries older than this many days.')
+def compact_audit_command(days):
+    """Move old change log entries into monthly archive tables."""
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    moved = archive_change_logs(cutoff, progress=lambda name, count: click.echo(f"{name}: {count} row(s)"))
+    click.echo(f"Archived {sum(moved.values())} change log row(s) older than {cutoff:%Y-%m-%d}.")
+
+
+@sessions_cli.command('purge')
+def purge_sessions_command():
+    """Delete expired session records."""
+    click.echo(f"Deleted {session_store.purge_expired()} expired session(s).")
+
+
+app.cli.add_command(forms_cli)
+app.cli.add_command(schema_cli)
+app.cli.add_command(users_cli)
+app.cli.add_command(matches_cli)
+app.cli.add_command(audit_cli)
+app.cli.add_command(sessions_cli)
@@ -0,0 +1,116 @@
+from itertools import chain
+from flask import current_app
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from app import db
+from models import User, UserRole, Page, Form, Match
+from caching import TTLCache
+
+# The admin dashboard's counts, shared by every admin in this process
+_metrics = TTLCache(maxsize=1)
+_METRICS_KEY = 'dashboard'
+
+# Columns each counted model contributes; changing any other column (e.g.
+# User.last_login on every sign-in) leaves the cached counts valid.
+METRIC_COLUMNS = {
+    User: ('role', 'is_admin'),
+    Page: ('is_published',),
+    Form: ('is_active', 'submission_count'),
+    Match: ('is_active',),
+}
+
+
+def _count(condition=None):
+    count = db.func.count()
+    return count.filter(condition) if condition is not None else count
+
+
+def metrics_query():
+    """One SELECT returning every dashboard count
+
+    Each table is aggregated once in its own subquery, with
+    COUNT(*) FILTER (WHERE ...) for the breakdowns, and the single-row
+    subqueries are cross-joined so the database does it in one round trip.
+    """
+    users = db.select(
+        _count().label('users_total'),
+        *[_count(User.role == role).label(f'users_{role.value}') for role in UserRole],
+        _count(User.is_admin.is_(True)).label('users_admin'),
+    ).subquery()
+    pages = db.select(
+        _count().label('pages_total'),
+        _count(Page.is_published.is_(True)).label('pages_published'),
+    ).subquery()
+    forms = db.select(
+        _count().label('forms_total'),
+        _count(Form.is_active.is_(True)).label('forms_active'),
+        # The per-form counters are already maintained; no submission scan
+        db.func.coalesce(db.func.sum(Form.submission_count), 0).label('submissions_total'),
+    ).subquery()
+    matches = db.select(_count(Match.is_active.is_(True)).label('matches_active')).subquery()
+    parts = (users, pages, forms, matches)
+    joined = parts[0]
+    for part in parts[1:]:
+        joined = joined.join(part, db.true())
+    return db.select(*parts).select_from(joined)
+
+
+def dashboard_metrics():
+    """Dashboard counts as a dict, cached for DASHBOARD_CACHE_TTL seconds"""
+    metrics = _metrics.get(_METRICS_KEY)
+    if metrics is None:
+        metrics = dict(db.session.execute(metrics_query()).one()._mapping)
+        metrics['pages_draft'] = metrics['pages_total'] - metrics['pages_published']
+        _metrics.set(_METRICS_KEY, metrics, ttl=current_app.config.get('DASHBOARD_CACHE_TTL', 0))
+    return metrics
+
+
+def invalidate_dashboard_metrics():
+    _metrics.clear()
+
+
+def _changes_metrics(obj):
+    columns = METRIC_COLUMNS.get(type(obj), ())
+    state = inspect(obj)
+    return any(state.attrs[name].history.has_changes() for name in columns)
+
+
+def mark_dashboard_stale(session):
+    """Drop the cached counts when session's transaction commits"""
+    session.info['dashboard_stale'] = True
+
+
+# Writes are noticed at flush or bulk-statement time and the cache is dropped
+# once the transaction commits, so route handlers, CLI commands and bulk
+# importers need no explicit invalidation calls. A bulk statement that may
+# leave the counts alone opts out with execution_options(affects_dashboard=False)
+# and calls mark_dashboard_stale() itself when they did change.
+
+@event.listens_for(Session, 'after_flush')
+def _note_flushed_changes(session, flush_context):
+    if session.info.get('dashboard_stale'):
+        return
+    counted = tuple(METRIC_COLUMNS)
+    if any(isinstance(obj, counted) for obj in chain(session.new, session.deleted)) \
+            or any(isinstance(obj, counted) and _changes_metrics(obj) for obj in session.dirty):
+        mark_dashboard_stale(session)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _note_bulk_changes(orm_execute_state):
+    if orm_execute_state.is_select or not orm_execute_state.execution_options.get('affects_dashboard', True):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and mapper.class_ in METRIC_COLUMNS:
+        mark_dashboard_stale(orm_execute_state.session)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_after_commit(session):
+    if session.info.pop('dashboard_stale', False):
+        invalidate_dashboard_metrics()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_after_rollback(session):
+    session.info.pop('dashboard_stale', None)
@@ -0,0 +1,85 @@
+import csv
+import io
+import json
+from app import db
+from models import Submission, User
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+
+# Columns that precede the form's own fields in every export
+BASE_COLUMNS = ('submission_id', 'submitted_at', 'username', 'email')
+
+
+def export_columns(form):
+    """Export header: submission metadata, then fields in Form.fields order"""
+    return list(BASE_COLUMNS) + [field['name'] for field in form.fields if field.get('name')]
+
+
+def iter_submission_rows(form, chunk_size=1000):
+    """Yield (id, created_at, username, email, responses) tuples for a form
+
+    Rows are fetched chunk_size at a time through a streaming cursor, so
+    memory does not grow with the number of submissions.
+    """
+    query = db.select(Submission.id, Submission.created_at, User.username, User.email, Submission.responses) \
+        .join(User, User.id == Submission.user_id) \
+        .where(Submission.form_id == form.id) \
+        .order_by(Submission.created_at, Submission.id) \
+        .execution_options(yield_per=chunk_size)
+    yield from db.session.execute(query)
+
+
+# Leading characters that make spreadsheet apps evaluate a cell as a formula
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _cell(value):
+    """Flatten a response value for CSV; checkbox answers are joined
+
+    Text that a spreadsheet would run as a formula is prefixed with a quote.
+    """
+    if isinstance(value, list):
+        value = '; '.join(str(item) for item in value)
+    if value is None:
+        return ''
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def stream_export(form, fmt, chunk_size=1000):
+    """Generate a form's submissions as CSV or JSONL text, one chunk at a time"""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f'Unsupported export format: {fmt}')
+    columns = export_columns(form)
+    field_names = columns[len(BASE_COLUMNS):]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if fmt == 'csv' else None
+    if writer is not None:
+        writer.writerow(columns)
+
+    for count, (submission_id, created_at, username, email, responses) in enumerate(
+            iter_submission_rows(form, chunk_size), start=1):
+        if writer is not None:
+            writer.writerow([submission_id, created_at.isoformat(), _cell(username), _cell(email)]
+                            + [_cell(responses.get(name)) for name in field_names])
+        else:
+            record = dict(zip(BASE_COLUMNS, (submission_id, created_at.isoformat(), username, email)))
+            record.update((name, responses.get(name)) for name in field_names)
+            buffer.write(json.dumps(record))
+            buffer.write('\n')
+
+        if count % chunk_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def export_filename(form, fmt):
+    return f'{form.slug}-submissions.{fmt}'
@@ -0,0 +1,141 @@
+from datetime import datetime
+from sqlalchemy import event
+from sqlalchemy.orm.attributes import flag_modified
+from app import db
+from models import Form, FormStats, Submission
+
+CHOICE_FIELD_TYPES = ('select', 'radio', 'checkbox')
+
+# Upper bounds of the text length histogram; longer answers land in the last bucket
+LENGTH_BUCKETS = (20, 50, 100, 250, 500, 1000)
+
+
+def _bucket(length):
+    for index, bound in enumerate(LENGTH_BUCKETS):
+        if length < bound:
+            return index
+    return len(LENGTH_BUCKETS)
+
+
+def bucket_labels():
+    """Human labels for the length histogram, one per bucket"""
+    labels, lower = [], 0
+    for bound in LENGTH_BUCKETS:
+        labels.append(f'{lower}-{bound - 1}')
+        lower = bound
+    labels.append(f'{lower}+')
+    return labels
+
+
+def add_responses(stats, fields, responses):
+    """Fold one submission's responses into a stats dict in place"""
+    stats['submissions'] = stats.get('submissions', 0) + 1
+    by_field = stats.setdefault('fields', {})
+    for field in fields:
+        name = field.get('name')
+        if not name:
+            continue
+        value = responses.get(name)
+        entry = by_field.setdefault(name, {'answered': 0})
+        if field.get('type') in CHOICE_FIELD_TYPES:
+            values = [item for item in (value if isinstance(value, list) else [value]) if item]
+            if values:
+                entry['answered'] += 1
+                options = entry.setdefault('options', {})
+                for item in values:
+                    options[item] = options.get(item, 0) + 1
+        elif value:
+            length = len(value)
+            entry['answered'] += 1
+            entry['length_total'] = entry.get('length_total', 0) + length
+            entry['length_min'] = min(entry.get('length_min', length), length)
+            entry['length_max'] = max(entry.get('length_max', length), length)
+            buckets = entry.setdefault('length_buckets', [0] * (len(LENGTH_BUCKETS) + 1))
+            buckets[_bucket(length)] += 1
+    return stats
+
+
+def rebuild_form_stats(form, chunk_size=1000):
+    """Recompute a form's stats from all of its submissions and store them"""
+    stats = {}
+    rows = db.session.execute(
+        db.select(Submission.responses)
+        .where(Submission.form_id == form.id)
+        .execution_options(yield_per=chunk_size)
+    ).scalars()
+    for responses in rows:
+        add_responses(stats, form.fields, responses)
+
+    row = db.session.get(FormStats, form.id)
+    if row is None:
+        row = FormStats(form_id=form.id)
+        db.session.add(row)
+    row.stats = stats
+    row.updated_at = datetime.utcnow()
+    return row
+
+
+@event.listens_for(Form, 'init')
+def _start_empty_stats(form, args, kwargs):
+    """New forms get their stats row in the same flush, before any submission"""
+    if 'stats' not in kwargs:
+        form.stats = FormStats(stats={})
+
+
+def forms_without_stats():
+    """Forms created before form_stats existed, to be backfilled by rebuild_form_stats"""
+    return Form.query.outerjoin(FormStats, FormStats.form_id == Form.id) \
+        .filter(FormStats.form_id.is_(None)).order_by(Form.id).all()
+
+
+def record_submission(form, responses):
+    """Add one new submission to the form's stats in the caller's transaction
+
+    The stats row is locked for the update where the database supports it.
+    A form without a stats row is left alone: it predates the table and is
+    backfilled by `flask schema sync` or `flask forms rebuild-stats`, never
+    by scanning submissions inside a request. Returns the row, or None.
+    """
+    row = db.session.execute(
+        db.select(FormStats).where(FormStats.form_id == form.id).with_for_update()
+    ).scalar_one_or_none()
+    if row is None:
+        return None
+    add_responses(row.stats, form.fields, responses)
+    flag_modified(row, 'stats')
+    row.updated_at = datetime.utcnow()
+    return row
+
+
+def field_summaries(form, stats):
+    """Per-field figures for the stats page, in Form.fields order"""
+    total = stats.get('submissions', 0)
+    by_field = stats.get('fields', {})
+    summaries = []
+    for field in form.fields:
+        name = field.get('name')
+        if not name:
+            continue
+        entry = by_field.get(name, {'answered': 0})
+        answered = entry.get('answered', 0)
+        summary = {
+            'name': name,
+            'label': field.get('label', name),
+            'type': field.get('type', 'text'),
+            'answered': answered,
+            'fill_rate': answered / total if total else 0.0,
+        }
+        if summary['type'] in CHOICE_FIELD_TYPES:
+            counts = dict(entry.get('options', {}))
+            options = [(option, counts.pop(option, 0)) for option in field.get('options') or ()]
+            options.extend(sorted(counts.items(), key=lambda item: -item[1]))
+            summary['options'] = [(option, count, count / answered if answered else 0.0)
+                                  for option, count in options]
+        else:
+            summary['length_avg'] = entry.get('length_total', 0) / answered if answered else 0
+            summary['length_min'] = entry.get('length_min', 0)
+            summary['length_max'] = entry.get('length_max', 0)
+            summary['length_buckets'] = list(zip(bucket_labels(),
+                                                 entry.get('length_buckets', [0] * (len(LENGTH_BUCKETS) + 1))))
+        summaries.append(summary)
+    return summaries
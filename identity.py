@@ -0,0 +1,77 @@
+from flask import g, has_app_context, session
+from app import db
+from models import User, UserRole
+from sessions import USER_SESSION_KEYS, user_session_data
+
+
+class Viewer:
+    """Read-only snapshot of the logged-in user, shared by decorators, views and templates
+
+    Identity (id, names, role, admin flag) comes from the session, whose
+    store record is version-checked on every request, so an admin edit or
+    logout reaches every worker at once. Profile fields are read from the
+    user row the first time a view asks for one.
+    """
+
+    __slots__ = ('id', 'username', 'first_name', 'is_admin', 'role', '_user')
+
+    PROFILE_FIELDS = ('email', 'last_name', 'created_at', 'last_login')
+
+    def __init__(self, identity, user=None):
+        self.id = identity['user_id']
+        self.username = identity['username']
+        self.first_name = identity['first_name']
+        self.is_admin = bool(identity['is_admin'])
+        self.role = UserRole(identity['role'])
+        self._user = user
+
+    @classmethod
+    def from_user(cls, user):
+        return cls(user_session_data(user), user)
+
+    def __getattr__(self, name):
+        if name not in Viewer.PROFILE_FIELDS:
+            raise AttributeError(name)
+        if self._user is None:
+            self._user = db.session.get(User, self.id)
+        return getattr(self._user, name)
+
+    def __repr__(self):
+        return f'<Viewer {self.username}>'
+
+    @property
+    def full_name(self):
+        return f"{self.first_name} {self.last_name}"
+
+    @property
+    def name(self):
+        return self.full_name
+
+
+def load_viewer(user_id):
+    """Viewer for the session's user, or None if the account is gone
+
+    Sessions missing identity keys (e.g. written before a key was added)
+    are completed from the user row once; the store keeps them afterwards.
+    """
+    if any(name not in session for name in USER_SESSION_KEYS):
+        user = db.session.get(User, user_id)
+        if user is None:
+            return None
+        session.update(user_session_data(user))
+        return Viewer.from_user(user)
+    return Viewer(session)
+
+
+def current_viewer():
+    """Return the viewer for this request, loading it at most once"""
+    if '_viewer' not in g:
+        user_id = session.get('user_id')
+        g._viewer = load_viewer(user_id) if user_id is not None else None
+    return g._viewer
+
+
+def invalidate_viewer(user_id):
+    """Drop this request's viewer for user_id so the next lookup rebuilds it"""
+    if has_app_context() and getattr(g, '_viewer', None) is not None and g._viewer.id == user_id:
+        g.pop('_viewer')
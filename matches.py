@@ -0,0 +1,42 @@
+from flask import current_app
+from models import Match
+from caching import TTLCache
+
+# Per-user sets of active match partners, shared by the match-aware scopes
+_matched_ids = TTLCache(maxsize=4096)
+
+
+class MatchedIds:
+    """Ids of the users someone is actively matched with, split by side"""
+
+    __slots__ = ('mentor_ids', 'mentee_ids')
+
+    def __init__(self, mentor_ids=frozenset(), mentee_ids=frozenset()):
+        # mentor_ids: this user's mentors; mentee_ids: this user's mentees
+        self.mentor_ids = mentor_ids
+        self.mentee_ids = mentee_ids
+
+    def __bool__(self):
+        return bool(self.mentor_ids or self.mentee_ids)
+
+
+def matched_ids(user_id):
+    """Return MatchedIds for user_id, cached for MATCH_CACHE_TTL seconds"""
+    ids = _matched_ids.get(user_id)
+    if ids is None:
+        ids = MatchedIds(*Match.active_partner_ids(user_id))
+        _matched_ids.set(user_id, ids, ttl=current_app.config.get('MATCH_CACHE_TTL', 0))
+    return ids
+
+
+def cached_matched_ids(user_id):
+    """MatchedIds for user_id if this process has them cached, else None"""
+    return _matched_ids.get(user_id)
+
+
+def invalidate_matched_ids(*user_ids):
+    """Forget cached partners for user_ids, or for everyone when none are given"""
+    if not user_ids:
+        _matched_ids.clear()
+    for user_id in user_ids:
+        _matched_ids.pop(user_id)
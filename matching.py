@@ -0,0 +1,275 @@
+import csv
+import heapq
+import json
+import time
+from collections import defaultdict
+from datetime import datetime
+from app import db
+from models import User, UserRole, Match, Form, Submission
+from matches import invalidate_matched_ids
+import scoring
+
+MENTOR_ROLES = (UserRole.MENTOR, UserRole.BOTH)
+MENTEE_ROLES = (UserRole.MENTEE, UserRole.BOTH)
+
+
+class MatchPlan:
+    """Validated (mentor_id, mentee_id) pairs plus the rows that were rejected"""
+
+    __slots__ = ('pairs', 'rejected', 'timings')
+
+    def __init__(self):
+        self.pairs = []
+        self.rejected = []
+        self.timings = {}
+
+
+def read_pairs(stream, fmt):
+    """Yield (mentor, mentee) identifiers from a CSV or JSONL pairing file
+
+    Identifiers may be usernames or email addresses.
+    """
+    if fmt == 'csv':
+        for record in csv.DictReader(stream):
+            yield (record.get('mentor') or '').strip().lower(), (record.get('mentee') or '').strip().lower()
+    elif fmt == 'jsonl':
+        for line in stream:
+            if line.strip():
+                record = json.loads(line)
+                yield str(record.get('mentor', '')).strip().lower(), str(record.get('mentee', '')).strip().lower()
+    else:
+        raise ValueError(f'Unsupported pairing format: {fmt}')
+
+
+def _resolve_users(keys):
+    """Map usernames and emails to (id, role) with one query per chunk"""
+    resolved = {}
+    keys = list(keys)
+    for start in range(0, len(keys), 5000):
+        chunk = keys[start:start + 5000]
+        rows = db.session.query(User.id, User.username, User.email, User.role).filter(
+            db.or_(User.username.in_(chunk), User.email.in_(chunk))
+        )
+        for user_id, username, email, role in rows:
+            resolved[username] = (user_id, role)
+            resolved[email] = (user_id, role)
+    return resolved
+
+
+def _active_pairs(user_ids):
+    """Active (mentor_id, mentee_id) pairs touching any of user_ids"""
+    pairs = set()
+    user_ids = list(user_ids)
+    for start in range(0, len(user_ids), 5000):
+        chunk = user_ids[start:start + 5000]
+        rows = db.session.query(Match.mentor_id, Match.mentee_id).filter(
+            Match.is_active.is_(True), Match.mentee_id.in_(chunk)
+        )
+        pairs.update(rows)
+    return pairs
+
+
+def plan_from_pairs(pairs):
+    """Validate identifier pairs against users and roles in bulk"""
+    plan = MatchPlan()
+    started = time.perf_counter()
+    pairs = list(pairs)
+    users = _resolve_users({key for pair in pairs for key in pair if key})
+    plan.timings['resolve'] = time.perf_counter() - started
+
+    candidates = []
+    for mentor_key, mentee_key in pairs:
+        mentor, mentee = users.get(mentor_key), users.get(mentee_key)
+        if mentor is None or mentee is None:
+            plan.rejected.append((mentor_key, mentee_key, 'unknown user'))
+        elif mentor[0] == mentee[0]:
+            plan.rejected.append((mentor_key, mentee_key, 'cannot match a user with themselves'))
+        elif mentor[1] not in MENTOR_ROLES:
+            plan.rejected.append((mentor_key, mentee_key, 'mentor does not have a mentor role'))
+        elif mentee[1] not in MENTEE_ROLES:
+            plan.rejected.append((mentor_key, mentee_key, 'mentee does not have a mentee role'))
+        else:
+            candidates.append((mentor[0], mentee[0], mentor_key, mentee_key))
+
+    existing = _active_pairs({mentee_id for _, mentee_id, _, _ in candidates})
+    seen = set()
+    for mentor_id, mentee_id, mentor_key, mentee_key in candidates:
+        pair = (mentor_id, mentee_id)
+        if pair in existing or pair in seen:
+            plan.rejected.append((mentor_key, mentee_key, 'already matched'))
+        else:
+            seen.add(pair)
+            plan.pairs.append(pair)
+    plan.timings['validate'] = time.perf_counter() - started - plan.timings['resolve']
+    return plan
+
+
+def _answer_tokens(form, field_names):
+    """Map user_id -> set of (field, value) tokens from a form's submissions"""
+    tokens = {}
+    rows = db.session.query(Submission.user_id, Submission.responses) \
+        .filter(Submission.form_id == form.id).yield_per(2000)
+    for user_id, responses in rows:
+        user_tokens = set()
+        for name in field_names:
+            value = responses.get(name)
+            for item in (value if isinstance(value, list) else [value]):
+                if item:
+                    user_tokens.add((name, item))
+        tokens[user_id] = user_tokens
+    return tokens
+
+
+def overlap_candidates(mentor_form, mentee_form, mentor_ids, mentee_ids, top_k=25):
+    """Rank the top_k mentors for each mentee by shared choice answers
+
+    Pure-Python fallback for scoring.top_candidates when numpy is missing.
+    Each answer maps to a bitset (a Python int) of the mentors who gave it.
+    at_least[k] holds mentors sharing k or more of a mentee's answers, so a
+    mentee costs a few big-int operations instead of a pass over all mentors.
+    """
+    fields = scoring.shared_choice_fields(mentor_form, mentee_form)
+    mentor_tokens = _answer_tokens(mentor_form, fields)
+    mentee_tokens = _answer_tokens(mentee_form, fields)
+
+    index = defaultdict(int)
+    for position, mentor_id in enumerate(mentor_ids):
+        for token in mentor_tokens.get(mentor_id, ()):
+            index[token] |= 1 << position
+    everyone = (1 << len(mentor_ids)) - 1
+
+    candidates = {}
+    for mentee_id in mentee_ids:
+        at_least = [everyone]
+        for token in mentee_tokens.get(mentee_id, ()):
+            bits = index.get(token)
+            if not bits:
+                continue
+            at_least.append(at_least[-1] & bits)
+            for k in range(len(at_least) - 2, 0, -1):
+                at_least[k] |= at_least[k - 1] & bits
+
+        ranked = []
+        for score in range(len(at_least) - 1, 0, -1):
+            exact = at_least[score] & ~at_least[score + 1] if score + 1 < len(at_least) else at_least[score]
+            while exact and len(ranked) < top_k:
+                low = exact & -exact
+                ranked.append((score, mentor_ids[low.bit_length() - 1]))
+                exact ^= low
+            if len(ranked) >= top_k:
+                break
+        candidates[mentee_id] = ranked
+    return candidates
+
+
+def greedy_assign(capacities, mentee_ids, candidates=None):
+    """Capacity-constrained greedy assignment
+
+    capacities maps mentor_id -> open slots and candidates maps mentee_id ->
+    [(score, mentor_id), ...] best first. Mentees with the strongest top
+    score choose first and take their best mentor with room; anyone left
+    over goes to the least-loaded mentor. Returns pairs.
+    """
+    candidates = candidates or {}
+    remaining = dict(capacities)
+    load = [(0, mentor_id) for mentor_id, slots in remaining.items() if slots > 0]
+    heapq.heapify(load)
+    assigned = {mentor_id: 0 for mentor_id in remaining}
+    pairs = []
+
+    def take(mentor_id, mentee_id):
+        remaining[mentor_id] -= 1
+        assigned[mentor_id] += 1
+        pairs.append((mentor_id, mentee_id))
+
+    leftovers = []
+    for mentee_id in sorted(mentee_ids, key=lambda m: -candidates[m][0][0] if candidates.get(m) else 0):
+        for _, mentor_id in candidates.get(mentee_id, ()):
+            if remaining.get(mentor_id, 0) > 0 and mentor_id != mentee_id:
+                take(mentor_id, mentee_id)
+                break
+        else:
+            leftovers.append(mentee_id)
+
+    # Fill the rest from a heap of (assigned, mentor_id); stale entries are
+    # refreshed lazily, and a BOTH user is never handed to themselves
+    for mentee_id in leftovers:
+        skipped = []
+        while load:
+            count, mentor_id = heapq.heappop(load)
+            if remaining[mentor_id] <= 0:
+                continue
+            if count != assigned[mentor_id]:
+                heapq.heappush(load, (assigned[mentor_id], mentor_id))
+            elif mentor_id == mentee_id:
+                skipped.append((count, mentor_id))
+            else:
+                take(mentor_id, mentee_id)
+                heapq.heappush(load, (assigned[mentor_id], mentor_id))
+                break
+        for entry in skipped:
+            heapq.heappush(load, entry)
+    return pairs
+
+
+def plan_assignment(capacity, mentor_form=None, mentee_form=None, candidates_fn=None, top_k=25):
+    """Assign unmatched mentees to mentors with at most capacity active mentees each
+
+    With forms, only users who submitted them take part and mentors are
+    ranked by shared answers (or by candidates_fn(mentor_ids, mentee_ids)).
+    """
+    plan = MatchPlan()
+    started = time.perf_counter()
+
+    mentors = db.session.query(User.id).filter(User.role.in_(MENTOR_ROLES))
+    mentees = db.session.query(User.id).filter(User.role.in_(MENTEE_ROLES))
+    if mentor_form is not None:
+        mentors = mentors.join(Submission, Submission.user_id == User.id).filter(Submission.form_id == mentor_form.id)
+    if mentee_form is not None:
+        mentees = mentees.join(Submission, Submission.user_id == User.id).filter(Submission.form_id == mentee_form.id)
+    has_mentor = db.select(Match.mentee_id).where(Match.is_active.is_(True))
+    mentees = mentees.filter(User.id.not_in(has_mentor))
+
+    mentor_ids = [user_id for (user_id,) in mentors]
+    mentee_ids = [user_id for (user_id,) in mentees]
+    load = dict(db.session.query(Match.mentor_id, db.func.count(Match.id))
+                .filter(Match.is_active.is_(True)).group_by(Match.mentor_id))
+    capacities = {mentor_id: capacity - load.get(mentor_id, 0) for mentor_id in mentor_ids}
+    plan.timings['load'] = time.perf_counter() - started
+
+    candidates = None
+    if candidates_fn is not None:
+        candidates = candidates_fn(mentor_ids, mentee_ids)
+    elif mentor_form is not None and mentee_form is not None and scoring.np is not None:
+        candidates = scoring.top_candidates(mentor_form, mentee_form, mentor_ids, mentee_ids, k=top_k)
+    elif mentor_form is not None and mentee_form is not None:
+        candidates = overlap_candidates(mentor_form, mentee_form, mentor_ids, mentee_ids, top_k=top_k)
+    plan.timings['score'] = time.perf_counter() - started - plan.timings['load']
+
+    plan.pairs = greedy_assign(capacities, mentee_ids, candidates)
+    assigned = {mentee_id for _, mentee_id in plan.pairs}
+    plan.rejected = [(None, mentee_id, 'no mentor capacity') for mentee_id in mentee_ids if mentee_id not in assigned]
+    plan.timings['assign'] = time.perf_counter() - started - plan.timings['load'] - plan.timings['score']
+    return plan
+
+
+def apply_plan(plan, batch_size=5000):
+    """Insert every planned match in a single transaction"""
+    started = time.perf_counter()
+    now = datetime.utcnow()
+    rows = [{'mentor_id': mentor_id, 'mentee_id': mentee_id, 'matched_at': now, 'is_active': True}
+            for mentor_id, mentee_id in plan.pairs]
+    try:
+        for start in range(0, len(rows), batch_size):
+            db.session.execute(db.insert(Match), rows[start:start + batch_size])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    invalidate_matched_ids()
+    plan.timings['insert'] = time.perf_counter() - started
+    return len(rows)
+
+
+def form_by_slug(slug):
+    return Form.query.filter_by(slug=slug).first() if slug else None
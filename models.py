@@ -1,4 +1,5 @@
 from app import db
+from sqlalchemy.orm import joinedload
 from datetime import datetime
 import enum
 
@@ -17,6 +18,24 @@ class UserRole(enum.Enum):
     MENTEE = "mentee"
     BOTH = "both"
 
+def scope_allows(scope, role, is_admin):
+    """Check a viewer scope against a role and admin flag"""
+    if scope == ViewerScope.ALL_USERS:
+        return True
+    elif scope == ViewerScope.ADMINS_ONLY:
+        return is_admin
+    elif scope == ViewerScope.MENTORS_ONLY:
+        return role in [UserRole.MENTOR, UserRole.BOTH]
+    elif scope == ViewerScope.MENTEES_ONLY:
+        return role in [UserRole.MENTEE, UserRole.BOTH]
+    elif scope == ViewerScope.SELF_ONLY:
+        # Needs the page's author - resolved by authorization.filter_visible
+        return False
+    elif scope in [ViewerScope.MATCHED_PAIR, ViewerScope.MENTOR_OF, ViewerScope.MENTEE_OF]:
+        # Need match context - resolved by authorization.filter_visible
+        return False
+    return False
+
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(64), unique=True, nullable=False)
@@ -33,6 +52,9 @@ class User(db.Model):
     mentee_matches = db.relationship('Match', foreign_keys='Match.mentee_id', backref='mentee', lazy='dynamic')
     change_logs = db.relationship('UserChangeLog', foreign_keys='UserChangeLog.user_id', backref='user', lazy='dynamic')
     
+    # Supports newest-first keyset pagination in the admin user list
+    __table_args__ = (db.Index('ix_user_created_at_id', 'created_at', 'id'),)
+    
     def __repr__(self):
         return f'<User {self.username}>'
     
@@ -45,38 +67,47 @@ class User(db.Model):
         """Alias for full_name to match requirements"""
         return self.full_name
     
-    def can_view_page(self, page):
-        """Check if user can view a specific page based on viewer scope"""
-        if page.viewer_scope == ViewerScope.ALL_USERS:
-            return True
-        elif page.viewer_scope == ViewerScope.ADMINS_ONLY:
-            return self.is_admin
-        elif page.viewer_scope == ViewerScope.MENTORS_ONLY:
-            return self.role in [UserRole.MENTOR, UserRole.BOTH]
-        elif page.viewer_scope == ViewerScope.MENTEES_ONLY:
-            return self.role in [UserRole.MENTEE, UserRole.BOTH]
-        elif page.viewer_scope == ViewerScope.SELF_ONLY:
-            # For user-specific content - requires additional context
-            return False
-        elif page.viewer_scope in [ViewerScope.MATCHED_PAIR, ViewerScope.MENTOR_OF, ViewerScope.MENTEE_OF]:
-            # These require match context - will be handled at route level
-            return False
-        return False
-    
     def get_active_matches_as_mentor(self):
-        """Get active matches where this user is the mentor"""
-        return self.mentor_matches.all()
+        """Get active matches where this user is the mentor, with mentees loaded"""
+        return self.mentor_matches.filter(Match.is_active.is_(True)) \
+            .options(joinedload(Match.mentee)).order_by(Match.id).all()
     
     def get_active_matches_as_mentee(self):
-        """Get active matches where this user is the mentee"""
-        return self.mentee_matches.all()
+        """Get active matches where this user is the mentee, with mentors loaded"""
+        return self.mentee_matches.filter(Match.is_active.is_(True)) \
+            .options(joinedload(Match.mentor)).order_by(Match.id).all()
+    
+    @classmethod
+    def active_mentees_of(cls, user_id):
+        """Mentees actively matched with the mentor user_id, in one joined query"""
+        return cls.query.join(Match, Match.mentee_id == cls.id) \
+            .filter(Match.mentor_id == user_id, Match.is_active.is_(True)) \
+            .order_by(Match.id).all()
+    
+    @classmethod
+    def active_mentor_of(cls, user_id):
+        """First active mentor of the mentee user_id, or None"""
+        return cls.query.join(Match, Match.mentor_id == cls.id) \
+            .filter(Match.mentee_id == user_id, Match.is_active.is_(True)) \
+            .order_by(Match.id).first()
     
     def is_matched_with(self, other_user):
-        """Check if this user is matched with another user"""
-        return Match.query.filter(
-            ((Match.mentor_id == self.id) & (Match.mentee_id == other_user.id)) |
-            ((Match.mentor_id == other_user.id) & (Match.mentee_id == self.id))
-        ).first() is not None
+        """Check if this user is in an active match with another user
+
+        Answered from the cached partner sets in matches when this process
+        has them, otherwise with one indexed EXISTS per direction.
+        """
+        from matches import cached_matched_ids  # matches imports this module
+        ids = cached_matched_ids(self.id)
+        if ids is not None:
+            return other_user.id in ids.mentor_ids or other_user.id in ids.mentee_ids
+        forward = db.select(Match.id).where(
+            Match.mentor_id == self.id, Match.mentee_id == other_user.id, Match.is_active.is_(True)
+        ).exists()
+        reverse = db.select(Match.id).where(
+            Match.mentor_id == other_user.id, Match.mentee_id == self.id, Match.is_active.is_(True)
+        ).exists()
+        return db.session.query(db.or_(forward, reverse)).scalar()
 
 class Page(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -91,10 +122,21 @@ class Page(db.Model):
     
     # Relationship
     created_by = db.relationship('User', backref=db.backref('pages', lazy=True))
+    rendered = db.relationship('RenderedPage', uselist=False, cascade='all, delete-orphan')
     
     def __repr__(self):
         return f'<Page {self.title}>'
 
+class RenderedPage(db.Model):
+    """Persisted HTML for a page, valid while page_updated_at matches the page"""
+    page_id = db.Column(db.Integer, db.ForeignKey('page.id'), primary_key=True)
+    page_updated_at = db.Column(db.DateTime, nullable=False)
+    renderer_version = db.Column(db.Integer, nullable=False)
+    html = db.Column(db.Text, nullable=False)
+    
+    def __repr__(self):
+        return f'<RenderedPage page:{self.page_id}>'
+
 class Match(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     mentor_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -102,8 +144,28 @@ class Match(db.Model):
     matched_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     is_active = db.Column(db.Boolean, default=True, nullable=False)
     
+    # Lookups from either side of a pair, limited to active matches
+    __table_args__ = (
+        db.Index('ix_match_mentor_mentee', mentor_id, mentee_id,
+                 postgresql_where=is_active.is_(True), sqlite_where=is_active.is_(True)),
+        db.Index('ix_match_mentee_mentor', mentee_id, mentor_id,
+                 postgresql_where=is_active.is_(True), sqlite_where=is_active.is_(True)),
+    )
+    
     def __repr__(self):
         return f'<Match mentor:{self.mentor_id} mentee:{self.mentee_id}>'
+    
+    @classmethod
+    def active_partner_ids(cls, user_id):
+        """Return (mentor_ids, mentee_ids) of user_id's active matches in one query"""
+        as_mentee = db.select(cls.mentor_id.label('partner_id'), db.literal('mentor').label('side')) \
+            .where(cls.mentee_id == user_id, cls.is_active.is_(True))
+        as_mentor = db.select(cls.mentee_id.label('partner_id'), db.literal('mentee').label('side')) \
+            .where(cls.mentor_id == user_id, cls.is_active.is_(True))
+        mentor_ids, mentee_ids = set(), set()
+        for partner_id, side in db.session.execute(db.union_all(as_mentee, as_mentor)):
+            (mentor_ids if side == 'mentor' else mentee_ids).add(partner_id)
+        return frozenset(mentor_ids), frozenset(mentee_ids)
 
 class UserChangeLog(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -117,10 +179,34 @@ class UserChangeLog(db.Model):
     # Relationships
     updated_by_user = db.relationship('User', foreign_keys=[updated_by], backref='changes_made')
     
+    # Per-user history and per-admin activity, newest first
+    __table_args__ = (
+        db.Index('ix_user_change_log_user_updated', user_id, updated_at, id),
+        db.Index('ix_user_change_log_actor_updated', updated_by, updated_at, id),
+    )
+    
     def __repr__(self):
         return f'<UserChangeLog {self.field_changed} for user:{self.user_id}>'
 
 
+class SessionRecord(db.Model):
+    """Server-side identity of a logged-in session, found by an opaque cookie id
+
+    Rows are keyed by a hash of that id so the table never holds usable
+    cookies. user_id is copied out of the data so an admin edit can rewrite
+    every live session of the edited user. version goes up on every write,
+    so workers can check a cached copy with a primary key lookup.
+    """
+    key = db.Column(db.String(64), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), index=True)
+    data = db.Column(db.JSON, nullable=False)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<SessionRecord user:{self.user_id}>'
+
+
 class Form(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
@@ -131,14 +217,30 @@ class Form(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     created_by_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    # Maintained by submit_form; `flask forms reconcile-counts` recomputes it
+    submission_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
     
     created_by = db.relationship('User', backref=db.backref('forms', lazy=True))
     submissions = db.relationship('Submission', backref='form', lazy='dynamic')
+    stats = db.relationship('FormStats', uselist=False, cascade='all, delete-orphan')
     
     def __repr__(self):
         return f'<Form {self.title}>'
 
 
+class FormStats(db.Model):
+    """Per-field answer aggregates for one form, read in a single row
+
+    Maintained by submit_form; `flask forms rebuild-stats` recomputes it.
+    """
+    form_id = db.Column(db.Integer, db.ForeignKey('form.id', ondelete='CASCADE'), primary_key=True)
+    stats = db.Column(db.JSON, nullable=False, default=dict)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    def __repr__(self):
+        return f'<FormStats form:{self.form_id}>'
+
+
 class Submission(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -147,9 +249,57 @@ class Submission(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     
     user = db.relationship('User', backref=db.backref('submissions', lazy=True))
+    answers = db.relationship('SubmissionAnswer', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
     
-    # Ensure one submission per user per form
-    __table_args__ = (db.UniqueConstraint('user_id', 'form_id', name='_user_form_uc'),)
+    # Ensure one submission per user per form; list a form's submissions in order
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'form_id', name='_user_form_uc'),
+        db.Index('ix_submission_form_created_id', form_id, created_at, id),
+    )
     
     def __repr__(self):
         return f'<Submission {self.user.username} -> {self.form.title}>'
+
+
+# Longest answer kept in submission_answer; longer text is cut to stay indexable
+ANSWER_VALUE_MAX = 255
+
+class SubmissionAnswer(db.Model):
+    """One row per answer value, so responses can be filtered and counted in SQL
+
+    Checkbox answers get one row per selected option. Submission.responses
+    stays the source of truth; `flask forms backfill-answers` fills this
+    table for submissions made before it existed.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    submission_id = db.Column(db.Integer, db.ForeignKey('submission.id', ondelete='CASCADE'), nullable=False)
+    form_id = db.Column(db.Integer, db.ForeignKey('form.id'), nullable=False)
+    field_name = db.Column(db.String(100), nullable=False)
+    value = db.Column(db.String(ANSWER_VALUE_MAX), nullable=False)
+    
+    __table_args__ = (
+        # Covers "submissions of this form that answered field = value"
+        db.Index('ix_submission_answer_lookup', form_id, field_name, value, submission_id),
+        db.Index('ix_submission_answer_submission', submission_id),
+    )
+    
+    def __repr__(self):
+        return f'<SubmissionAnswer {self.field_name}={self.value!r} submission:{self.submission_id}>'
+    
+    @classmethod
+    def rows_for(cls, submission_id, form_id, responses):
+        """Insert parameters for one submission's answers, skipping blanks"""
+        rows = []
+        for field_name, answer in responses.items():
+            values = answer if isinstance(answer, list) else [answer]
+            for value in dict.fromkeys(str(value).strip()[:ANSWER_VALUE_MAX] for value in values if value is not None):
+                if value:
+                    rows.append({'submission_id': submission_id, 'form_id': form_id,
+                                 'field_name': field_name[:100], 'value': value})
+        return rows
+    
+    @classmethod
+    def submission_ids(cls, form_id, field_name, value):
+        """Select of submission ids whose field_name answer includes value"""
+        return db.select(cls.submission_id).where(
+            cls.form_id == form_id, cls.field_name == field_name, cls.value == value)
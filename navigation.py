@@ -0,0 +1,76 @@
+import threading
+import time
+from collections import namedtuple
+from flask import current_app
+from app import db
+from models import Page, ViewerScope, UserRole, scope_allows
+
+# Only the columns the navigation menu renders and authorizes on
+NavPage = namedtuple('NavPage', ['id', 'slug', 'title', 'viewer_scope', 'created_by_id'])
+
+
+class NavigationIndex:
+    """Published pages bucketed by viewer scope, with menus precomputed per role
+
+    The index is rebuilt lazily after invalidate() is called by the page admin
+    routes. NAV_CACHE_TTL bounds how long another worker's writes can go unseen.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = None
+        self._generation = 0
+
+    def invalidate(self):
+        self._generation += 1
+        self._state = None
+
+    def _is_fresh(self, state):
+        if state is None:
+            return False
+        ttl = current_app.config.get('NAV_CACHE_TTL', 0)
+        return not ttl or time.monotonic() - state[0] < ttl
+
+    def _build(self):
+        rows = db.session.query(Page.id, Page.slug, Page.title, Page.viewer_scope, Page.created_by_id) \
+            .filter(Page.is_published.is_(True)) \
+            .order_by(Page.id).all()
+
+        buckets = {scope: [] for scope in ViewerScope}
+        for row in rows:
+            buckets[row.viewer_scope].append(NavPage(*row))
+
+        menus = {}
+        for role in UserRole:
+            for is_admin in (False, True):
+                visible = [page for scope, pages in buckets.items()
+                           if scope_allows(scope, role, is_admin) for page in pages]
+                visible.sort(key=lambda page: page.id)
+                menus[(role, is_admin)] = tuple(visible)
+
+        buckets = {scope: tuple(pages) for scope, pages in buckets.items()}
+        return (time.monotonic(), menus, buckets)
+
+    def _current(self):
+        state = self._state
+        if not self._is_fresh(state):
+            with self._lock:
+                state = self._state
+                if not self._is_fresh(state):
+                    generation = self._generation
+                    state = self._build()
+                    # Don't publish an index that a concurrent write already outdated
+                    if generation == self._generation:
+                        self._state = state
+        return state
+
+    def pages_for(self, role, is_admin):
+        """Return the published pages a viewer with this role can see"""
+        return self._current()[1][(role, bool(is_admin))]
+
+    def pages_in_scope(self, scope):
+        """Return the published pages in one viewer scope bucket"""
+        return self._current()[2][scope]
+
+
+nav_index = NavigationIndex()
@@ -0,0 +1,101 @@
+import base64
+from datetime import datetime
+from sqlalchemy import text, tuple_
+from app import db
+from caching import TTLCache
+
+# Table row counts, refreshed at most once a minute per table
+_row_counts = TTLCache(ttl=60, maxsize=64)
+
+
+class KeysetPage:
+    """One page of rows plus opaque cursors for the neighbouring pages"""
+
+    __slots__ = ('items', 'per_page', 'next_cursor', 'prev_cursor')
+
+    def __init__(self, items, per_page, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+
+def encode_cursor(timestamp, row_id):
+    raw = f"{timestamp.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Decode a cursor into (timestamp, id); raises ValueError if malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        timestamp, row_id = raw.split('|')
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except (UnicodeDecodeError, TypeError, ValueError) as e:
+        raise ValueError(f'Invalid page cursor: {cursor!r}') from e
+
+
+def keyset_paginate(query, timestamp_col, id_col, per_page, after=None, before=None):
+    """Paginate query newest first on (timestamp_col, id_col)
+
+    Pass the previous page's next_cursor as after, or its prev_cursor as
+    before. Each page costs one indexed range scan of per_page + 1 rows,
+    however deep into the table it is.
+    """
+    key = tuple_(timestamp_col, id_col)
+
+    def cursor_for(row):
+        return encode_cursor(getattr(row, timestamp_col.key), getattr(row, id_col.key))
+
+    if before:
+        rows = query.filter(key > tuple_(*decode_cursor(before))) \
+            .order_by(timestamp_col.asc(), id_col.asc()) \
+            .limit(per_page + 1).all()
+        has_prev = len(rows) > per_page
+        rows = rows[:per_page]
+        rows.reverse()
+        has_next = True
+    else:
+        if after:
+            query = query.filter(key < tuple_(*decode_cursor(after)))
+        rows = query.order_by(timestamp_col.desc(), id_col.desc()) \
+            .limit(per_page + 1).all()
+        has_next = len(rows) > per_page
+        rows = rows[:per_page]
+        has_prev = after is not None
+
+    if not rows:
+        return KeysetPage(rows, per_page)
+    return KeysetPage(
+        rows, per_page,
+        next_cursor=cursor_for(rows[-1]) if has_next else None,
+        prev_cursor=cursor_for(rows[0]) if has_prev else None,
+    )
+
+
+def estimated_row_count(model):
+    """Row count for model's table, cached briefly; uses planner stats on Postgres"""
+    table_name = model.__table__.name
+    count = _row_counts.get(table_name)
+    if count is None:
+        count = -1
+        if db.engine.dialect.name == 'postgresql':
+            quoted = db.engine.dialect.identifier_preparer.quote(table_name)
+            count = db.session.execute(
+                text("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:name)"),
+                {'name': quoted}
+            ).scalar()
+            count = -1 if count is None else count
+        if count < 0:
+            # No statistics yet (or not Postgres): count exactly
+            count = db.session.query(model).count()
+        _row_counts.set(table_name, count)
+    return count
@@ -0,0 +1,80 @@
+import queue
+import re
+from contextlib import contextmanager
+import markdown
+
+MARKDOWN_EXTENSIONS = ['fenced_code', 'tables', 'nl2br']
+
+# Allow basic HTML color styling (sanitize input)
+COLOR_SPAN_PATTERN = re.compile(
+    r'<span\s+style="color:\s*((?:#[0-9a-fA-F]{3,6})|(?:rgb\([^)]+\))|(?:[a-zA-Z]+))"\s*>'
+)
+
+# Form label formatting, applied in this order
+LABEL_BOLD_PATTERN = re.compile(r'\*\*(.*?)\*\*')
+LABEL_ITALIC_PATTERN = re.compile(r'\*(.*?)\*')
+LABEL_LINK_PATTERN = re.compile(r'\[([^\]]+)\]\(([^)]+)\)')
+
+
+class MarkdownPool:
+    """Thread-safe pool of pre-built Markdown engines
+
+    Building a markdown.Markdown registers every extension and compiles its
+    patterns, which costs more than converting a short page. Engines are
+    handed out one caller at a time and reset() before going back.
+    """
+
+    def __init__(self, extensions=None, size=8):
+        self.extensions = list(extensions or MARKDOWN_EXTENSIONS)
+        self.size = size
+        self._engines = queue.LifoQueue(maxsize=size)
+        for _ in range(size):
+            self._engines.put_nowait(self._build())
+
+    def _build(self):
+        return markdown.Markdown(extensions=self.extensions)
+
+    @contextmanager
+    def engine(self):
+        try:
+            md = self._engines.get_nowait()
+        except queue.Empty:
+            # Pool exhausted under load: build a spare rather than block
+            md = self._build()
+        try:
+            yield md
+        finally:
+            md.reset()
+            try:
+                self._engines.put_nowait(md)
+            except queue.Full:
+                pass
+
+
+markdown_pool = MarkdownPool()
+
+
+def process_content(content):
+    """Process markdown content with limited HTML support"""
+    with markdown_pool.engine() as md:
+        html = md.convert(content)
+
+    return COLOR_SPAN_PATTERN.sub(r'<span style="color: \1">', html)
+
+
+def process_form_label(text):
+    """Process form labels with simple markdown-like formatting"""
+    if not text:
+        return ''
+    
+    # Bold: **text** -> <strong>text</strong>
+    text = LABEL_BOLD_PATTERN.sub(r'<strong>\1</strong>', text)
+    
+    # Italic: *text* -> <em>text</em>
+    text = LABEL_ITALIC_PATTERN.sub(r'<em>\1</em>', text)
+    
+    # Links: [text](url) -> <a href="url" target="_blank" rel="noopener">text</a>
+    text = LABEL_LINK_PATTERN.sub(r'<a href="\2" target="_blank" rel="noopener">\1</a>', text)
+    
+    # Line breaks
+    return text.replace('\n', '<br>')
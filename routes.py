@@ -1,11 +1,27 @@
-from flask import render_template, request, redirect, url_for, session, flash, abort
+from flask import render_template, request, redirect, url_for, session, flash, abort, Response, stream_with_context, jsonify
+from sqlalchemy.exc import SQLAlchemyError
 from app import app, db
-from models import User, Page, ViewerScope, UserRole, Match, UserChangeLog, Form, Submission
+from models import (User, Page, RenderedPage, ViewerScope, UserRole, Match, UserChangeLog, Form, FormStats,
+                    Submission, SubmissionAnswer)
 from forms import LoginForm, PageForm, UserEditForm, FormBuilderForm
+from identity import current_viewer, invalidate_viewer
+from accounts import upsert_login_user
+from sessions import session_store, user_session_data
+from audit import (AUDITED_USER_FIELDS, audit_writer, change_log_rows, diff_changes, insert_change_logs,
+                   history_query, change_to_dict)
+from navigation import nav_index
+from dashboard import dashboard_metrics
+from caching import LRUCache
+from rendering import process_content, process_form_label
+from validation import ValidationPlan
+from pagination import keyset_paginate, estimated_row_count
+from authorization import can_view, available_forms, navigation_pages
+from exports import EXPORT_FORMATS, stream_export, export_filename
+from form_stats import record_submission, rebuild_form_stats, field_summaries
+from submissions import (ANSWER_FILTER_PREFIX, browse_query, answer_filters, parse_role,
+                         requested_columns, project_answers)
 from datetime import datetime
 from functools import wraps
-import markdown
-import re
 import json
 
 def admin_required(f):
@@ -16,7 +32,7 @@ def admin_required(f):
             flash('Please log in to access this page.', 'warning')
             return redirect(url_for('login'))
         
-        user = User.query.get(session['user_id'])
+        user = current_viewer()
         if not user or not user.is_admin:
             flash('Admin access required.', 'error')
             return redirect(url_for('dashboard'))
@@ -31,6 +47,12 @@ def login_required(f):
         if 'user_id' not in session:
             flash('Please log in to access this page.', 'warning')
             return redirect(url_for('login'))
+        
+        if not current_viewer():
+            # User was deleted, clear session
+            session.clear()
+            flash('User account not found. Please log in again.', 'error')
+            return redirect(url_for('login'))
         return f(*args, **kwargs)
     return decorated_function
 
@@ -58,49 +80,18 @@ def login():
             last_name = (form.last_name.data or '').strip()
             print(f"Form data processed: {username}, {email}, {first_name}, {last_name}")
             
-            # Check if user exists by username or email
-            user = User.query.filter(
-                (User.username == username) | (User.email == email)
-            ).first()
-            
-            if not user:
-                # Create new user (fake registration)
-                # Make first user admin for demo purposes
-                is_first_user = User.query.count() == 0
-                user = User()
-                user.username = username
-                user.email = email
-                user.first_name = first_name
-                user.last_name = last_name
-                user.is_admin = is_first_user
-                user.role = UserRole.MENTEE
-                user.created_at = datetime.utcnow()
-                db.session.add(user)
+            # One INSERT ... ON CONFLICT creates the account or refreshes it
+            user, created = upsert_login_user(username, email, first_name, last_name)
+            db.session.commit()
+            invalidate_viewer(user.id)
+            if created:
                 flash(f'Welcome to the mentorship platform, {first_name}! Your account has been created.', 'success')
             else:
-                # Update existing user info (but keep username and email if they match existing)
-                if user.username != username and user.email == email:
-                    # Same email, different username - update username
-                    user.username = username
-                elif user.username == username and user.email != email:
-                    # Same username, different email - update email
-                    user.email = email
-                
-                # Always update name fields
-                user.first_name = first_name
-                user.last_name = last_name
                 flash(f'Welcome back, {first_name}!', 'success')
             
-            # Update last login
-            user.last_login = datetime.utcnow()
-            db.session.commit()
-            
-            # Set session
-            session['user_id'] = user.id
-            session['username'] = user.username
-            session['first_name'] = user.first_name
-            session['is_admin'] = user.is_admin
-            session['role'] = user.role.value
+            # Set session, under a fresh id so a pre-login id can't be reused
+            session.regenerate()
+            session.update(user_session_data(user))
             
             return redirect(url_for('dashboard'))
             
@@ -119,7 +110,7 @@ def dashboard():
         flash('Please log in to access the dashboard.', 'warning')
         return redirect(url_for('login'))
     
-    user = User.query.get(session['user_id'])
+    user = current_viewer()
     if not user:
         # User was deleted, clear session
         session.clear()
@@ -133,17 +124,12 @@ def dashboard():
 @admin_required
 def admin_dashboard():
     """Admin dashboard"""
-    user = User.query.get(session['user_id'])
-    total_users = User.query.count()
-    total_pages = Page.query.count()
-    published_pages = Page.query.filter_by(is_published=True).count()
+    user = current_viewer()
     recent_pages = Page.query.order_by(Page.updated_at.desc()).limit(5).all()
     
     return render_template('admin/dashboard.html', 
                          user=user,
-                         total_users=total_users,
-                         total_pages=total_pages,
-                         published_pages=published_pages,
+                         metrics=dashboard_metrics(),
                          recent_pages=recent_pages)
 
 @app.route('/admin/pages')
@@ -175,7 +161,10 @@ def admin_new_page():
         page.created_by_id = session['user_id']
         
         db.session.add(page)
+        db.session.flush()
+        store_rendered_page(page)
         db.session.commit()
+        nav_index.invalidate()
         
         flash(f'Page "{page.title}" created successfully!', 'success')
         return redirect(url_for('admin_pages'))
@@ -205,8 +194,10 @@ def admin_edit_page(page_id):
         page.viewer_scope = ViewerScope(form.viewer_scope.data)
         page.is_published = form.is_published.data
         page.updated_at = datetime.utcnow()
+        store_rendered_page(page)
         
         db.session.commit()
+        nav_index.invalidate()
         
         flash(f'Page "{page.title}" updated successfully!', 'success')
         return redirect(url_for('admin_pages'))
@@ -222,42 +213,58 @@ def admin_delete_page(page_id):
     
     db.session.delete(page)
     db.session.commit()
+    nav_index.invalidate()
+    _rendered_pages.discard_where(lambda key: key[0] == page_id)
     
     flash(f'Page "{title}" deleted successfully!', 'success')
     return redirect(url_for('admin_pages'))
 
-def process_content(content):
-    """Process markdown content with limited HTML support"""
-    # Configure markdown with extensions
-    md = markdown.Markdown(extensions=['fenced_code', 'tables', 'nl2br'])
-    
-    # Convert markdown to HTML
-    html = md.convert(content)
+# Bump when process_content output changes so persisted HTML is re-rendered
+RENDERER_VERSION = 1
+
+# Rendered page HTML keyed by (page.id, page.updated_at)
+_rendered_pages = LRUCache(maxsize=256)
+
+def store_rendered_page(page):
+    """Render a page and cache the HTML; the persisted copy joins the caller's transaction"""
+    html = process_content(page.content)
+    _rendered_pages.discard_where(lambda key: key[0] == page.id)
+    _rendered_pages.set((page.id, page.updated_at), html)
     
-    # Allow basic HTML color styling (sanitize input)
-    color_pattern = r'<span\s+style="color:\s*((?:#[0-9a-fA-F]{3,6})|(?:rgb\([^)]+\))|(?:[a-zA-Z]+))"\s*>'
-    html = re.sub(color_pattern, r'<span style="color: \1">', html)
+    if app.config.get('PAGE_RENDER_PERSIST', True):
+        if page.rendered is None:
+            page.rendered = RenderedPage(page_id=page.id)
+        page.rendered.page_updated_at = page.updated_at
+        page.rendered.renderer_version = RENDERER_VERSION
+        page.rendered.html = html
     
     return html
 
-def process_form_label(text):
-    """Process form labels with simple markdown-like formatting"""
-    if not text:
-        return ''
-    
-    # Bold: **text** -> <strong>text</strong>
-    text = re.sub(r'\*\*(.*?)\*\*', r'<strong>\1</strong>', text)
-    
-    # Italic: *text* -> <em>text</em>
-    text = re.sub(r'\*(.*?)\*', r'<em>\1</em>', text)
-    
-    # Links: [text](url) -> <a href="url" target="_blank" rel="noopener">text</a>
-    text = re.sub(r'\[([^\]]+)\]\(([^)]+)\)', r'<a href="\2" target="_blank" rel="noopener">\1</a>', text)
-    
-    # Line breaks
-    text = text.replace('\n', '<br>')
-    
-    return text
+def render_page_content(page):
+    """Return the HTML for a page, rendering only when no cached copy matches"""
+    key = (page.id, page.updated_at)
+    html = _rendered_pages.get(key)
+    if html is not None:
+        return html
+    
+    if not app.config.get('PAGE_RENDER_PERSIST', True):
+        html = process_content(page.content)
+        _rendered_pages.set(key, html)
+        return html
+    
+    rendered = page.rendered
+    if (rendered is not None and rendered.page_updated_at == page.updated_at
+            and rendered.renderer_version == RENDERER_VERSION):
+        _rendered_pages.set(key, rendered.html)
+        return rendered.html
+    
+    # Pages saved before the cache existed are rendered once and persisted
+    html = store_rendered_page(page)
+    try:
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+    return html
 
 # Static Page Routes
 @app.route('/page/<slug>')
@@ -265,15 +272,15 @@ def process_form_label(text):
 def view_page(slug):
     """View a static page"""
     page = Page.query.filter_by(slug=slug, is_published=True).first_or_404()
-    user = User.query.get(session['user_id'])
+    user = current_viewer()
     
     # Check if user can view this page
-    if not user.can_view_page(page):
+    if not can_view(user, page):
         flash('You do not have permission to view this page.', 'error')
         return redirect(url_for('dashboard'))
     
-    # Process the content (markdown + limited HTML)
-    processed_content = process_content(page.content)
+    # Process the content (markdown + limited HTML), cached per page version
+    processed_content = render_page_content(page)
     
     return render_template('page.html', page=page, processed_content=processed_content)
 
@@ -288,9 +295,19 @@ def logout():
 @app.route('/admin/users')
 @admin_required
 def admin_users():
-    """Admin user management"""
-    users = User.query.order_by(User.created_at.desc()).all()
-    return render_template('admin/users.html', users=users)
+    """Admin user management, newest first with keyset pagination"""
+    per_page = min(max(request.args.get('per_page', 50, type=int), 1), 200)
+    try:
+        page = keyset_paginate(User.query, User.created_at, User.id, per_page,
+                               after=request.args.get('after'),
+                               before=request.args.get('before'))
+    except ValueError:
+        abort(400)
+    
+    return render_template('admin/users.html',
+                         users=page.items,
+                         page=page,
+                         total_users=estimated_row_count(User))
 
 @app.route('/admin/users/<int:user_id>/edit', methods=['GET', 'POST'])
 @admin_required
@@ -300,80 +317,78 @@ def admin_edit_user(user_id):
     form = UserEditForm(obj=user)
     
     if form.validate_on_submit():
-        # Log changes
-        current_user = User.query.get(session['user_id'])
-        
-        # Check each field for changes and log them
-        if user.first_name != form.first_name.data:
-            log_change = UserChangeLog()
-            log_change.user_id = user.id
-            log_change.field_changed = 'first_name'
-            log_change.old_value = user.first_name
-            log_change.new_value = form.first_name.data
-            log_change.updated_by = current_user.id
-            db.session.add(log_change)
-        
-        if user.last_name != form.last_name.data:
-            log_change = UserChangeLog()
-            log_change.user_id = user.id
-            log_change.field_changed = 'last_name'
-            log_change.old_value = user.last_name
-            log_change.new_value = form.last_name.data
-            log_change.updated_by = current_user.id
-            db.session.add(log_change)
-        
-        if user.email != form.email.data:
-            log_change = UserChangeLog()
-            log_change.user_id = user.id
-            log_change.field_changed = 'email'
-            log_change.old_value = user.email
-            log_change.new_value = form.email.data
-            log_change.updated_by = current_user.id
-            db.session.add(log_change)
-        
-        if user.role.value != form.role.data:
-            log_change = UserChangeLog()
-            log_change.user_id = user.id
-            log_change.field_changed = 'role'
-            log_change.old_value = user.role.value
-            log_change.new_value = form.role.data
-            log_change.updated_by = current_user.id
-            db.session.add(log_change)
-        
-        if user.is_admin != form.is_admin.data:
-            log_change = UserChangeLog()
-            log_change.user_id = user.id
-            log_change.field_changed = 'is_admin'
-            log_change.old_value = str(user.is_admin)
-            log_change.new_value = str(form.is_admin.data)
-            log_change.updated_by = current_user.id
-            db.session.add(log_change)
-        
-        # Update user
         user.first_name = form.first_name.data
         user.last_name = form.last_name.data
         user.email = form.email.data
         user.role = UserRole(form.role.data)
         user.is_admin = form.is_admin.data
         
-        db.session.commit()
+        # Log what actually changed, read from attribute history, in one INSERT
+        log_rows = change_log_rows(user.id, current_viewer().id, diff_changes(user, AUDITED_USER_FIELDS))
+        if app.config['AUDIT_ASYNC']:
+            db.session.commit()
+            audit_writer.enqueue(app, log_rows)
+        else:
+            insert_change_logs(log_rows)
+            db.session.commit()
+        invalidate_viewer(user.id)
+        # The user's logged-in sessions pick up the new role without re-login
+        session_store.update_user(user.id, user_session_data(user))
         flash(f'User {user.full_name} updated successfully!', 'success')
         return redirect(url_for('admin_users'))
     
     return render_template('admin/edit_user.html', form=form, user=user)
 
+def audit_page():
+    """Keyset page of change log entries for the ?user_id= and ?by= filters"""
+    per_page = min(max(request.args.get('per_page', 50, type=int), 1), 200)
+    user_id = request.args.get('user_id', type=int)
+    actor_id = request.args.get('by', type=int)
+    try:
+        page = keyset_paginate(history_query(user_id, actor_id),
+                               UserChangeLog.updated_at, UserChangeLog.id, per_page,
+                               after=request.args.get('after'),
+                               before=request.args.get('before'))
+    except ValueError:
+        abort(400)
+    return page, user_id, actor_id
+
+@app.route('/admin/audit')
+@admin_required
+@login_required
+def admin_audit():
+    """Change history for one user, activity of one admin, or everything"""
+    page, user_id, actor_id = audit_page()
+    filter_args = {key: value for key, value in (('user_id', user_id), ('by', actor_id)) if value is not None}
+    return render_template('admin/audit.html',
+                         page=page,
+                         subject=db.session.get(User, user_id) if user_id else None,
+                         actor=db.session.get(User, actor_id) if actor_id else None,
+                         filter_args=filter_args)
+
+@app.route('/admin/api/audit')
+@admin_required
+@login_required
+def admin_audit_api():
+    """JSON version of the audit view, with the same filters and cursors"""
+    page, _, _ = audit_page()
+    return jsonify({
+        'items': [change_to_dict(log) for log in page.items],
+        'next_cursor': page.next_cursor,
+        'prev_cursor': page.prev_cursor,
+    })
+
 @app.route('/my-mentees')
 @login_required
 def my_mentees():
     """Show mentees for current mentor"""
-    current_user = User.query.get(session['user_id'])
+    viewer = current_viewer()
     
-    if current_user.role not in [UserRole.MENTOR, UserRole.BOTH]:
+    if viewer.role not in [UserRole.MENTOR, UserRole.BOTH]:
         flash('You must be a mentor to access this page.', 'error')
         return redirect(url_for('dashboard'))
     
-    matches = current_user.get_active_matches_as_mentor()
-    mentees = [match.mentee for match in matches]
+    mentees = User.active_mentees_of(viewer.id)
     
     return render_template('my_mentees.html', mentees=mentees)
 
@@ -381,14 +396,13 @@ def my_mentees():
 @login_required
 def my_mentor():
     """Show mentor for current mentee"""
-    current_user = User.query.get(session['user_id'])
+    viewer = current_viewer()
     
-    if current_user.role not in [UserRole.MENTEE, UserRole.BOTH]:
+    if viewer.role not in [UserRole.MENTEE, UserRole.BOTH]:
         flash('You must be a mentee to access this page.', 'error')
         return redirect(url_for('dashboard'))
     
-    matches = current_user.get_active_matches_as_mentee()
-    mentor = matches[0].mentor if matches else None
+    mentor = User.active_mentor_of(viewer.id)
     
     return render_template('my_mentor.html', mentor=mentor)
 
@@ -482,15 +496,21 @@ def admin_edit_form(form_id):
             flash('Invalid form field configuration.', 'error')
             return render_template('admin/form_builder.html', form=form, form_obj=form_obj)
         
+        fields_changed = fields != form_obj.fields
         form_obj.title = form.title.data
         form_obj.slug = form.slug.data
         form_obj.fields = fields
+        if fields_changed:
+            # Tallies are keyed by field name and shaped by field type
+            rebuild_form_stats(form_obj)
         form_obj.viewer_scope = ViewerScope(form.viewer_scope.data)
         form_obj.is_active = form.is_active.data
         form_obj.updated_at = datetime.utcnow()
         
         try:
             db.session.commit()
+            _processed_fields.discard_where(lambda key: key[0] == form_id)
+            _validation_plans.discard_where(lambda key: key[0] == form_id)
             flash(f'Form "{form_obj.title}" updated successfully!', 'success')
             return redirect(url_for('admin_forms'))
         except Exception as e:
@@ -516,12 +536,14 @@ def admin_delete_form(form_id):
     
     try:
         # Check if form has submissions
-        submission_count = form_obj.submissions.count()
+        submission_count = form_obj.submission_count
         if submission_count > 0:
             flash(f'Cannot delete form "{form_obj.title}" - it has {submission_count} submission(s).', 'error')
         else:
             db.session.delete(form_obj)
             db.session.commit()
+            _processed_fields.discard_where(lambda key: key[0] == form_id)
+            _validation_plans.discard_where(lambda key: key[0] == form_id)
             flash(f'Application form "{form_obj.title}" deleted successfully!', 'success')
     except Exception as e:
         db.session.rollback()
@@ -530,19 +552,129 @@ def admin_delete_form(form_id):
     return redirect(url_for('admin_forms'))
 
 
+@app.route('/admin/forms/<int:form_id>/submissions')
+@admin_required
+@login_required
+def admin_form_submissions(form_id):
+    """Browse a form's submissions, newest first, filtered by answer and role"""
+    form_obj = Form.query.get_or_404(form_id)
+    per_page = min(max(request.args.get('per_page', 50, type=int), 1), 200)
+    answers = answer_filters(form_obj, request.args)
+    columns = requested_columns(form_obj, request.args.getlist('columns'))
+    try:
+        role = parse_role(request.args.get('role'))
+        page = keyset_paginate(browse_query(form_obj, role, answers),
+                               Submission.created_at, Submission.id, per_page,
+                               after=request.args.get('after'),
+                               before=request.args.get('before'))
+    except ValueError:
+        abort(400)
+    
+    # Filters carried over into the pagination links
+    filter_args = {f'{ANSWER_FILTER_PREFIX}{name}': value for name, value in answers}
+    if role is not None:
+        filter_args['role'] = role.value
+    if request.args.getlist('columns'):
+        filter_args['columns'] = columns
+    
+    return render_template('admin/submissions.html',
+                         form=form_obj,
+                         page=page,
+                         columns=columns,
+                         answers=project_answers([sub.id for sub in page.items], columns),
+                         active_answers=dict(answers),
+                         role=role,
+                         filter_args=filter_args)
+
+
+@app.route('/admin/forms/<int:form_id>/submissions/<int:submission_id>')
+@admin_required
+@login_required
+def admin_submission_detail(form_id, submission_id):
+    """Full responses for one submission, loaded when its row is expanded"""
+    submission = Submission.query.filter_by(id=submission_id, form_id=form_id).first_or_404()
+    return render_template('admin/submission_detail.html',
+                         form=submission.form,
+                         submission=submission)
+
+
+@app.route('/admin/forms/<int:form_id>/stats')
+@admin_required
+@login_required
+def admin_form_stats(form_id):
+    """Per-field answer statistics, read from the form's precomputed stats row"""
+    row = db.session.query(Form, FormStats) \
+        .outerjoin(FormStats, FormStats.form_id == Form.id) \
+        .filter(Form.id == form_id).first()
+    if row is None:
+        abort(404)
+    form_obj, form_stats = row
+    stats = form_stats.stats if form_stats else {}
+    return render_template('admin/form_stats.html',
+                         form=form_obj,
+                         form_stats=form_stats,
+                         total=stats.get('submissions', 0),
+                         summaries=field_summaries(form_obj, stats))
+
+
+@app.route('/admin/forms/<int:form_id>/export.<fmt>')
+@admin_required
+@login_required
+def admin_export_submissions(form_id, fmt):
+    """Stream a form's submissions as CSV or JSONL"""
+    if fmt not in EXPORT_FORMATS:
+        abort(404)
+    form_obj = Form.query.get_or_404(form_id)
+    return Response(
+        stream_with_context(stream_export(form_obj, fmt)),
+        mimetype=EXPORT_FORMATS[fmt],
+        headers={'Content-Disposition': f'attachment; filename="{export_filename(form_obj, fmt)}"'},
+    )
+
+
+# Form fields with rendered labels keyed by (form.id, form.updated_at)
+_processed_fields = LRUCache(maxsize=128)
+
+def get_processed_fields(form_obj):
+    """Return form fields with labels processed, computed once per form version"""
+    key = (form_obj.id, form_obj.updated_at)
+    fields = _processed_fields.get(key)
+    if fields is None:
+        fields = []
+        for field in form_obj.fields:
+            processed_field = field.copy()
+            processed_field['label'] = process_form_label(field.get('label', ''))
+            fields.append(processed_field)
+        fields = tuple(fields)
+        _processed_fields.set(key, fields)
+    return fields
+
+
+@app.route('/forms')
+@login_required
+def my_forms():
+    """List the active forms the current user can fill in"""
+    viewer = current_viewer()
+    forms = available_forms(viewer)
+    
+    # Mark the ones already submitted with a single lookup
+    submitted_ids = {form_id for (form_id,) in db.session.query(Submission.form_id).filter(
+        Submission.user_id == viewer.id,
+        Submission.form_id.in_([form.id for form in forms])
+    )} if forms else set()
+    
+    return render_template('my_forms.html', forms=forms, submitted_ids=submitted_ids)
+
+
 @app.route('/form/<slug>')
 @login_required
 def form_view(slug):
     """Show form to users"""
     form_obj = Form.query.filter_by(slug=slug, is_active=True).first_or_404()
-    user = User.query.get(session['user_id'])
+    user = current_viewer()
     
     # Check if user can access this form based on viewer scope
-    if form_obj.viewer_scope == ViewerScope.ADMINS_ONLY and not user.is_admin:
-        abort(403)
-    elif form_obj.viewer_scope == ViewerScope.MENTORS_ONLY and user.role not in [UserRole.MENTOR, UserRole.BOTH]:
-        abort(403)
-    elif form_obj.viewer_scope == ViewerScope.MENTEES_ONLY and user.role not in [UserRole.MENTEE, UserRole.BOTH]:
+    if not can_view(user, form_obj):
         abort(403)
     
     # Check if user already submitted this form
@@ -556,35 +688,39 @@ def form_view(slug):
                              form=form_obj, 
                              submission=existing_submission)
     
-    # Process form labels for rich text formatting
+    # Process form labels for rich text formatting (cached per form version)
     processed_form = {
         'id': form_obj.id,
         'title': form_obj.title,
         'slug': form_obj.slug,
-        'fields': []
+        'fields': get_processed_fields(form_obj)
     }
     
-    for field in form_obj.fields:
-        processed_field = field.copy()
-        processed_field['label'] = process_form_label(field.get('label', ''))
-        processed_form['fields'].append(processed_field)
-    
     return render_template('apply.html', form=processed_form)
 
 
+# Compiled validation plans keyed by (form.id, form.updated_at)
+_validation_plans = LRUCache(maxsize=128)
+
+def get_validation_plan(form_obj):
+    """Return the validation plan for a form, compiled once per form version"""
+    key = (form_obj.id, form_obj.updated_at)
+    plan = _validation_plans.get(key)
+    if plan is None:
+        plan = ValidationPlan(form_obj.fields)
+        _validation_plans.set(key, plan)
+    return plan
+
+
 @app.route('/form/<slug>/submit', methods=['POST'])
 @login_required
 def submit_form(slug):
     """Process form submission"""
     form_obj = Form.query.filter_by(slug=slug, is_active=True).first_or_404()
-    user = User.query.get(session['user_id'])
+    user = current_viewer()
     
     # Check if user can access this form based on viewer scope
-    if form_obj.viewer_scope == ViewerScope.ADMINS_ONLY and not user.is_admin:
-        abort(403)
-    elif form_obj.viewer_scope == ViewerScope.MENTORS_ONLY and user.role not in [UserRole.MENTOR, UserRole.BOTH]:
-        abort(403)
-    elif form_obj.viewer_scope == ViewerScope.MENTEES_ONLY and user.role not in [UserRole.MENTEE, UserRole.BOTH]:
+    if not can_view(user, form_obj):
         abort(403)
     
     # Check if user already submitted this form
@@ -597,68 +733,12 @@ def submit_form(slug):
         flash('You have already submitted this form.', 'warning')
         return redirect(url_for('form_view', slug=slug))
     
-    # Collect form responses
-    responses = {}
-    for field in form_obj.fields:
-        field_name = field['name']
-        field_type = field.get('type', 'text')
-        
-        # Handle different field types
-        if field_type == 'checkbox':
-            # Get all selected values for checkbox groups
-            field_values = request.form.getlist(field_name)
-            max_selections = field.get('max_selections', 1)
-            
-            # Validate max selections
-            if len(field_values) > max_selections:
-                flash(f'{field["label"]}: Maximum {max_selections} selection(s) allowed.', 'error')
-                return render_template('apply.html', form=form_obj)
-            
-            # Check if required
-            if field.get('required', False) and not field_values:
-                flash(f'{field["label"]} is required.', 'error')
-                return render_template('apply.html', form=form_obj)
-            
-            responses[field_name] = field_values
-        else:
-            # Single value fields
-            field_value = request.form.get(field_name, '').strip()
-            
-            # Basic required validation
-            if field.get('required', False) and not field_value:
-                flash(f'{field["label"]} is required.', 'error')
-                return render_template('apply.html', form=form_obj)
-            
-            # Type-specific validation
-            if field_value:  # Only validate if value is provided
-                # Character length validation for text fields
-                if field_type in ['text', 'textarea']:
-                    min_length = field.get('min_length')
-                    max_length = field.get('max_length')
-                    
-                    if min_length and len(field_value) < min_length:
-                        flash(f'{field["label"]}: Must be at least {min_length} characters long.', 'error')
-                        return render_template('apply.html', form=form_obj)
-                    
-                    if max_length and len(field_value) > max_length:
-                        flash(f'{field["label"]}: Must not exceed {max_length} characters.', 'error')
-                        return render_template('apply.html', form=form_obj)
-                
-                # Email format validation
-                if field_type == 'email':
-                    email_pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-                    if not re.match(email_pattern, field_value):
-                        flash(f'{field["label"]}: Please enter a valid email address.', 'error')
-                        return render_template('apply.html', form=form_obj)
-                
-                # URL format validation
-                elif field_type == 'url':
-                    url_pattern = r'^https?://.+\..+'
-                    if not re.match(url_pattern, field_value):
-                        flash(f'{field["label"]}: Please enter a valid URL (starting with http:// or https://).', 'error')
-                        return render_template('apply.html', form=form_obj)
-            
-            responses[field_name] = field_value
+    # Validate every field in one pass using the form's compiled plan
+    responses, errors = get_validation_plan(form_obj).run(request.form)
+    if errors:
+        for error in errors:
+            flash(error, 'error')
+        return render_template('apply.html', form=form_obj)
     
     # Create submission
     try:
@@ -668,6 +748,23 @@ def submit_form(slug):
             responses=responses
         )
         db.session.add(submission)
+        db.session.flush()
+        # Index the answers for SQL filtering alongside the JSON copy
+        answer_rows = SubmissionAnswer.rows_for(submission.id, form_obj.id, responses)
+        if answer_rows:
+            db.session.execute(db.insert(SubmissionAnswer), answer_rows)
+        # Stats are a summary: a failure here must not lose the submission
+        try:
+            with db.session.begin_nested():
+                record_submission(form_obj, responses)
+        except SQLAlchemyError:
+            app.logger.exception('Could not update statistics for form %s', form_obj.id)
+        # Bump the denormalized counter in the same transaction; keep updated_at
+        # so cached labels and validation plans stay valid
+        Form.query.filter_by(id=form_obj.id).update({
+            Form.submission_count: Form.submission_count + 1,
+            Form.updated_at: Form.updated_at
+        }, synchronize_session=False)
         db.session.commit()
         
         flash('Your submission has been submitted successfully!', 'success')
@@ -699,9 +796,8 @@ def inject_user():
     # Get available pages for navigation
     available_pages = []
     if user_info.get('logged_in'):
-        user = User.query.get(user_info['user_id'])
+        user = current_viewer()
         if user:
-            all_pages = Page.query.filter_by(is_published=True).all()
-            available_pages = [page for page in all_pages if user.can_view_page(page)]
+            available_pages = navigation_pages(user)
     
     return dict(current_user=user_info, available_pages=available_pages)
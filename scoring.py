@@ -0,0 +1,148 @@
+from app import db
+from models import Submission
+
+try:
+    import numpy as np
+except ImportError:  # optional: pip install numpy (the "matching" extra)
+    np = None
+
+# Field types whose answers are comparable between a mentor and a mentee form
+CHOICE_FIELD_TYPES = ('select', 'radio', 'checkbox')
+
+
+def shared_choice_fields(*forms):
+    """Names of choice fields present in every given form"""
+    names = None
+    for form in forms:
+        form_names = {field['name'] for field in form.fields if field.get('type') in CHOICE_FIELD_TYPES}
+        names = form_names if names is None else names & form_names
+    return names or set()
+
+
+class Vocabulary:
+    """Column index for each (field, answer) pair, seeded from the form options"""
+
+    def __init__(self, forms, field_names):
+        self.columns = {}
+        self.fields = []
+        for form in forms:
+            for field in form.fields:
+                if field['name'] in field_names:
+                    for option in field.get('options') or ():
+                        self.column(field['name'], option)
+
+    def column(self, name, value):
+        key = (name, value)
+        index = self.columns.get(key)
+        if index is None:
+            index = self.columns[key] = len(self.fields)
+            self.fields.append(name)
+        return index
+
+    def __len__(self):
+        return len(self.fields)
+
+
+def _encode(form, vocabulary, field_names, user_ids=None):
+    """Sparse one-hot coordinates for a form's submissions
+
+    Returns (user_ids, rows, cols); only users in user_ids are kept when given.
+    """
+    wanted = set(user_ids) if user_ids is not None else None
+    ids, rows, cols = [], [], []
+    query = db.session.query(Submission.user_id, Submission.responses) \
+        .filter(Submission.form_id == form.id).order_by(Submission.id).yield_per(2000)
+    seen = {}
+    for user_id, responses in query:
+        if wanted is not None and user_id not in wanted:
+            continue
+        row = seen.get(user_id)
+        if row is None:
+            row = seen[user_id] = len(ids)
+            ids.append(user_id)
+        for name in field_names:
+            value = responses.get(name)
+            for item in (value if isinstance(value, list) else [value]):
+                if item:
+                    rows.append(row)
+                    cols.append(vocabulary.column(name, item))
+    return ids, rows, cols
+
+
+def _dense(count, width, rows, cols):
+    matrix = np.zeros((count, width), dtype=np.float32)
+    matrix[rows, cols] = 1.0
+    return matrix
+
+
+def answer_matrices(mentor_form, mentee_form, mentor_ids=None, mentee_ids=None):
+    """One-hot encode both forms' choice answers over a shared vocabulary
+
+    Returns (mentor_ids, mentor_matrix, mentee_ids, mentee_matrix, vocabulary)
+    where row i of each matrix holds the answers of the i-th id.
+    """
+    if np is None:
+        raise RuntimeError('Compatibility scoring requires numpy.')
+    field_names = shared_choice_fields(mentor_form, mentee_form)
+    vocabulary = Vocabulary((mentor_form, mentee_form), field_names)
+    mentor_ids, mentor_rows, mentor_cols = _encode(mentor_form, vocabulary, field_names, mentor_ids)
+    mentee_ids, mentee_rows, mentee_cols = _encode(mentee_form, vocabulary, field_names, mentee_ids)
+    width = len(vocabulary)
+    return (np.array(mentor_ids, dtype=np.int64), _dense(len(mentor_ids), width, mentor_rows, mentor_cols),
+            np.array(mentee_ids, dtype=np.int64), _dense(len(mentee_ids), width, mentee_rows, mentee_cols),
+            vocabulary)
+
+
+def _column_weights(vocabulary, weights):
+    """Per-column weight vector from a {field_name: weight} mapping"""
+    weights = weights or {}
+    return np.array([weights.get(name, 1.0) for name in vocabulary.fields], dtype=np.float32)
+
+
+def compatibility_matrix(mentor_form, mentee_form, weights=None, mentor_ids=None, mentee_ids=None):
+    """Full mentor x mentee score matrix: the weighted count of shared answers
+
+    Returns (mentor_ids, mentee_ids, scores) with scores[i, j] for the i-th
+    mentor and j-th mentee. Memory is mentors x mentees floats; use
+    top_candidates for large pools.
+    """
+    mentor_ids, mentors, mentee_ids, mentees, vocabulary = answer_matrices(
+        mentor_form, mentee_form, mentor_ids, mentee_ids)
+    scores = (mentors * _column_weights(vocabulary, weights)) @ mentees.T
+    return mentor_ids, mentee_ids, scores
+
+
+def top_candidates(mentor_form, mentee_form, mentor_ids=None, mentee_ids=None, k=25, weights=None,
+                   chunk_size=4096):
+    """Best k mentors per mentee, as {mentee_id: [(score, mentor_id), ...]} best first
+
+    Scores are computed chunk_size mentees at a time so memory stays at
+    mentors x chunk_size. Mentors sharing no answers, and a user paired
+    with themselves, are left out.
+    """
+    mentor_ids, mentors, mentee_ids, mentees, vocabulary = answer_matrices(
+        mentor_form, mentee_form, mentor_ids, mentee_ids)
+    candidates = {}
+    if not len(mentor_ids):
+        return {int(mentee_id): [] for mentee_id in mentee_ids}
+
+    weighted = mentors * _column_weights(vocabulary, weights)
+    k = min(k, len(mentor_ids))
+    for start in range(0, len(mentee_ids), chunk_size):
+        chunk_ids = mentee_ids[start:start + chunk_size]
+        # (chunk, mentors): one row of mentor scores per mentee
+        scores = mentees[start:start + chunk_size] @ weighted.T
+        _, self_rows, self_cols = np.intersect1d(chunk_ids, mentor_ids, return_indices=True)
+        scores[self_rows, self_cols] = 0
+
+        best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        best_scores = np.take_along_axis(scores, best, axis=1)
+        order = np.argsort(-best_scores, axis=1, kind='stable')
+        best = np.take_along_axis(best, order, axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+
+        # Convert whole chunks to Python lists; per-element numpy scalars are slow
+        for mentee_id, ranked_ids, values in zip(chunk_ids.tolist(), mentor_ids[best].tolist(),
+                                                 best_scores.tolist()):
+            candidates[mentee_id] = [(score, mentor_id) for score, mentor_id in zip(values, ranked_ids) if score > 0]
+    return candidates
@@ -0,0 +1,261 @@
+import hashlib
+import secrets
+from datetime import datetime
+from sqlalchemy import event
+from flask.sessions import SecureCookieSession, SecureCookieSessionInterface
+from app import app, db
+from models import SessionRecord, User
+from caching import TTLCache
+
+# Longest cookie value treated as a session id; anything else is ignored
+_MAX_SID_LENGTH = 128
+
+# Keys of a logged-in session that live in the session store. Everything
+# else (flashes, the CSRF token, anonymous state) stays in the signed cookie,
+# so it never costs a store write.
+USER_SESSION_KEYS = ('user_id', 'username', 'first_name', 'is_admin', 'role')
+
+
+def session_key(sid):
+    """Store key for a cookie's session id"""
+    return hashlib.sha256(sid.encode()).hexdigest()
+
+
+def user_session_data(user):
+    """Identity keys kept in a logged-in session, from a User or a RETURNING row"""
+    return {
+        'user_id': user.id,
+        'username': user.username,
+        'first_name': user.first_name,
+        'is_admin': bool(user.is_admin),
+        'role': user.role.value,
+    }
+
+
+class ServerSession(SecureCookieSession):
+    """Session dict split between the signed cookie and a session store record"""
+
+    def __init__(self, initial=None):
+        super().__init__(initial)
+        self.sid = None
+        self.previous_sid = None
+        # The store record as loaded, to write back only what this request changed
+        self.stored = {}
+
+    def regenerate(self):
+        """Move the identity to a fresh id on save, e.g. at login, and drop the old record"""
+        if self.sid is not None:
+            self.previous_sid = self.sid
+            self.sid = None
+        self.stored = {}
+        self.modified = True
+
+
+class TableSessionStore:
+    """Session records in the session_record table
+
+    Records are versioned dicts. Besides load/create/update/delete a store
+    can report a record's current version and rewrite every record of one
+    user. Each call runs in its own short transaction, independent of the
+    request's db.session.
+    """
+
+    table = SessionRecord.__table__
+
+    def _live(self, key):
+        return db.and_(self.table.c.key == key, self.table.c.expires_at > datetime.utcnow())
+
+    def version(self, key):
+        with db.engine.connect() as conn:
+            return conn.execute(db.select(self.table.c.version).where(self._live(key))).scalar()
+
+    def load(self, key):
+        """(version, data) of a live record, or None"""
+        with db.engine.connect() as conn:
+            row = conn.execute(
+                db.select(self.table.c.version, self.table.c.data).where(self._live(key))).first()
+        return (row.version, row.data) if row else None
+
+    def create(self, key, data, expires_at):
+        with db.engine.begin() as conn:
+            conn.execute(self.table.insert().values(
+                key=key, data=data, user_id=data.get('user_id'), version=1, expires_at=expires_at))
+        return 1, data
+
+    def update(self, key, changes, removed=()):
+        """Merge changes into a live record; returns (version, data), or None if it is gone"""
+        with db.engine.begin() as conn:
+            row = conn.execute(
+                db.select(self.table.c.version, self.table.c.data).where(self._live(key)).with_for_update()
+            ).first()
+            if row is None:
+                return None
+            data = {name: value for name, value in row.data.items() if name not in removed}
+            data.update(changes)
+            conn.execute(self.table.update().where(self.table.c.key == key).values(
+                data=data, user_id=data.get('user_id'), version=row.version + 1))
+        return row.version + 1, data
+
+    def delete(self, key):
+        with db.engine.begin() as conn:
+            conn.execute(self.table.delete().where(self.table.c.key == key))
+
+    def update_user(self, user_id, changes):
+        """Merge changes into every live record of user_id; returns {key: (version, data)}"""
+        with db.engine.begin() as conn:
+            rows = conn.execute(
+                db.select(self.table.c.key, self.table.c.version, self.table.c.data)
+                .where(self.table.c.user_id == user_id, self.table.c.expires_at > datetime.utcnow())
+                .with_for_update()
+            ).all()
+            updated = {row.key: (row.version + 1, {**row.data, **changes}) for row in rows}
+            if updated:
+                conn.execute(
+                    self.table.update().where(self.table.c.key == db.bindparam('record_key'))
+                    .values(data=db.bindparam('record_data'), version=db.bindparam('record_version')),
+                    [{'record_key': key, 'record_data': data, 'record_version': version}
+                     for key, (version, data) in updated.items()])
+        return updated
+
+    def purge_expired(self, now=None):
+        with db.engine.begin() as conn:
+            return conn.execute(
+                self.table.delete().where(self.table.c.expires_at <= (now or datetime.utcnow()))).rowcount
+
+
+class CachedSessionStore:
+    """An in-process LRU of session records in front of another store
+
+    Every load still asks the backend for the record's version, so a logout
+    or admin edit made by any worker takes effect on the next request. The
+    cache saves reading and decoding the data while the version is unchanged.
+    """
+
+    def __init__(self, backend, maxsize=10000, ttl=300):
+        self.backend = backend
+        self._cache = TTLCache(ttl=ttl, maxsize=maxsize)
+
+    def _remember(self, key, entry):
+        if entry is None:
+            self._cache.pop(key)
+        else:
+            self._cache.set(key, entry)
+        return entry
+
+    def load(self, key):
+        version = self.backend.version(key)
+        if version is None:
+            self._cache.pop(key)
+            return None
+        entry = self._cache.get(key)
+        if entry is None or entry[0] != version:
+            entry = self._remember(key, self.backend.load(key))
+        return entry[1] if entry else None
+
+    def create(self, key, data, expires_at):
+        return self._remember(key, self.backend.create(key, data, expires_at))
+
+    def update(self, key, changes, removed=()):
+        return self._remember(key, self.backend.update(key, changes, removed))
+
+    def delete(self, key):
+        self.backend.delete(key)
+        self._cache.pop(key)
+
+    def update_user(self, user_id, changes):
+        updated = self.backend.update_user(user_id, changes)
+        for key, entry in updated.items():
+            if key in self._cache:
+                self._cache.set(key, entry)
+        return updated
+
+    def purge_expired(self, now=None):
+        return self.backend.purge_expired(now)
+
+
+class ServerSessionInterface(SecureCookieSessionInterface):
+    """Signed cookie sessions whose logged-in identity lives in a session store
+
+    Anonymous sessions are plain signed cookies and never touch the store.
+    Once a session has a user_id, USER_SESSION_KEYS are kept in a store
+    record named by a random id in a second cookie, and a request writes
+    back only the identity keys it changed, so it cannot undo an admin's
+    concurrent update_user.
+    """
+
+    session_class = ServerSession
+
+    def __init__(self, store):
+        self.store = store
+
+    def get_id_cookie_name(self, app):
+        return f'{self.get_cookie_name(app)}_id'
+
+    def _cookie_options(self, app):
+        return dict(domain=self.get_cookie_domain(app), path=self.get_cookie_path(app),
+                    secure=self.get_cookie_secure(app), samesite=self.get_cookie_samesite(app),
+                    httponly=self.get_cookie_httponly(app), partitioned=self.get_cookie_partitioned(app))
+
+    def open_session(self, app, request):
+        session = super().open_session(app, request)
+        if session is None:
+            return None
+        # Identity is only ever trusted from the store, never from the cookie
+        for name in USER_SESSION_KEYS:
+            session.pop(name, None)
+        sid = request.cookies.get(self.get_id_cookie_name(app))
+        if sid and len(sid) <= _MAX_SID_LENGTH:
+            data = self.store.load(session_key(sid))
+            if data is not None:
+                dict.update(session, data)
+                session.sid = sid
+                session.stored = dict(data)
+        return session
+
+    def save_session(self, app, session, response):
+        self._save_identity(app, session, response)
+        client = self.session_class({name: value for name, value in session.items()
+                                     if name not in USER_SESSION_KEYS})
+        client.modified = session.modified
+        client.accessed = session.accessed
+        super().save_session(app, client, response)
+
+    def _save_identity(self, app, session, response):
+        if session.previous_sid is not None:
+            self.store.delete(session_key(session.previous_sid))
+            session.previous_sid = None
+
+        identity = {name: session[name] for name in USER_SESSION_KEYS if name in session} \
+            if 'user_id' in session else {}
+        if not identity:
+            if session.sid is not None:
+                # Logged out: the record goes, for every worker
+                self.store.delete(session_key(session.sid))
+                response.delete_cookie(self.get_id_cookie_name(app), **self._cookie_options(app))
+                session.sid = None
+            return
+
+        if session.sid is None:
+            session.sid = secrets.token_urlsafe(32)
+            self.store.create(session_key(session.sid), identity,
+                              datetime.utcnow() + app.permanent_session_lifetime)
+            response.set_cookie(self.get_id_cookie_name(app), session.sid,
+                                expires=self.get_expiration_time(app, session), **self._cookie_options(app))
+            return
+
+        missing = object()
+        changes = {name: value for name, value in identity.items() if session.stored.get(name, missing) != value}
+        removed = [name for name in session.stored if name not in identity]
+        if changes or removed:
+            self.store.update(session_key(session.sid), changes, removed)
+
+
+@event.listens_for(User, 'after_delete')
+def _end_deleted_user_sessions(mapper, connection, user):
+    """Same as the user_id foreign key's ON DELETE CASCADE, for databases not enforcing it"""
+    connection.execute(SessionRecord.__table__.delete().where(SessionRecord.user_id == user.id))
+
+
+session_store = CachedSessionStore(TableSessionStore(), maxsize=app.config['SESSION_CACHE_SIZE'],
+                                   ttl=app.config['SESSION_CACHE_TTL'])
+app.session_interface = ServerSessionInterface(session_store)
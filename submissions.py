@@ -0,0 +1,72 @@
+from sqlalchemy.orm import contains_eager, defer
+from app import db
+from models import Submission, SubmissionAnswer, User, UserRole
+
+# Query-string prefix for answer filters, e.g. ?answer.skills=Python
+ANSWER_FILTER_PREFIX = 'answer.'
+
+# Field types left out of the list by default; long text loads on expand
+EXPANDED_ONLY_TYPES = ('textarea',)
+
+
+def default_columns(form):
+    """Field names shown in the submission list unless ?columns= says otherwise"""
+    return [field['name'] for field in form.fields
+            if field.get('name') and field.get('type') not in EXPANDED_ONLY_TYPES]
+
+
+def requested_columns(form, names):
+    """The requested field names that exist on form, in form order"""
+    if not names:
+        return default_columns(form)
+    wanted = set(names)
+    return [field['name'] for field in form.fields if field.get('name') in wanted]
+
+
+def answer_filters(form, args):
+    """(field_name, value) pairs from ?answer.<field>=<value>, for fields on form"""
+    known = {field.get('name') for field in form.fields}
+    filters = []
+    for key, values in args.lists():
+        name = key[len(ANSWER_FILTER_PREFIX):] if key.startswith(ANSWER_FILTER_PREFIX) else None
+        if name in known:
+            filters.extend((name, value.strip()) for value in values if value.strip())
+    return filters
+
+
+def parse_role(value):
+    """UserRole for ?role=, or None when absent; raises ValueError if unknown"""
+    return UserRole(value) if value else None
+
+
+def browse_query(form, role=None, answers=()):
+    """Submissions of form with their users joined in, responses deferred
+
+    Answer filters are semi-joins on the submission_answer index; the user
+    is loaded from the same join, so rendering a page issues no per-row
+    queries.
+    """
+    query = Submission.query \
+        .join(Submission.user) \
+        .options(contains_eager(Submission.user), defer(Submission.responses)) \
+        .filter(Submission.form_id == form.id)
+    if role is not None:
+        query = query.filter(User.role == role)
+    for field_name, value in answers:
+        query = query.filter(Submission.id.in_(SubmissionAnswer.submission_ids(form.id, field_name, value)))
+    return query
+
+
+def project_answers(submission_ids, field_names):
+    """{submission_id: {field: answer}} for just the named fields
+
+    Only the requested keys are extracted from the JSON column, in one
+    query for the whole page.
+    """
+    if not submission_ids or not field_names:
+        return {submission_id: {} for submission_id in submission_ids}
+    columns = [Submission.responses[name] for name in field_names]
+    rows = db.session.execute(
+        db.select(Submission.id, *columns).where(Submission.id.in_(submission_ids))
+    )
+    return {row[0]: dict(zip(field_names, row[1:])) for row in rows}
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Tests for the user change audit trail
+
+Covers:
+- Field diffs from attribute history, written with one INSERT
+- The background audit writer and its inline fallback
+- Indexed, keyset-paginated history view and API
+- Compaction into monthly archive tables
+"""
+
+import unittest
+from datetime import datetime, timedelta
+from app import app, db
+from models import User, UserRole, UserChangeLog
+from audit import (AuditWriter, AUDITED_USER_FIELDS, audit_writer, diff_changes, change_log_rows,
+                   insert_change_logs, history_query, archive_change_logs)
+import audit
+from test_request_caching import count_queries
+
+
+class AuditTest(unittest.TestCase):
+
+    def setUp(self):
+        """Set up test environment"""
+        app.config['TESTING'] = True
+        app.config['WTF_CSRF_ENABLED'] = False
+        self.client = app.test_client()
+
+        with app.app_context():
+            db.create_all()
+            admin = User(username='admin_audit', email='admin@audit.com', first_name='Admin',
+                         last_name='User', is_admin=True, role=UserRole.BOTH)
+            member = User(username='member_audit', email='member@audit.com', first_name='Member',
+                          last_name='User', role=UserRole.MENTEE)
+            db.session.add_all([admin, member])
+            db.session.commit()
+            self.admin_id = admin.id
+            self.member_id = member.id
+
+        with self.client.session_transaction() as sess:
+            sess.clear()
+            sess['user_id'] = self.admin_id
+
+    def tearDown(self):
+        """Clean up test environment"""
+        app.config['AUDIT_ASYNC'] = False
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+            audit._archive_metadata.drop_all(db.engine)
+
+    def edit_member(self, **changes):
+        data = {'first_name': 'Member', 'last_name': 'User', 'email': 'member@audit.com',
+                'role': 'mentee', 'is_admin': ''}
+        data.update(changes)
+        return self.client.post(f'/admin/users/{self.member_id}/edit', data=data)
+
+    def logged_changes(self):
+        with app.app_context():
+            return {(log.field_changed, log.old_value, log.new_value, log.updated_by)
+                    for log in UserChangeLog.query.filter_by(user_id=self.member_id)}
+
+    def test_diff_reads_attribute_history(self):
+        """Only assignments that change the stored text are reported"""
+        with app.app_context():
+            member = db.session.get(User, self.member_id)
+            member.first_name = 'Member'
+            member.role = UserRole.BOTH
+            member.is_admin = True
+            self.assertEqual(diff_changes(member, AUDITED_USER_FIELDS),
+                             [('role', 'mentee', 'both'), ('is_admin', 'False', 'True')])
+            db.session.rollback()
+
+    def test_edit_logs_changes_in_one_insert(self):
+        """Several changed fields cost a single change log INSERT"""
+        with app.app_context():
+            with count_queries() as statements:
+                self.edit_member(first_name='Ada', email='ada@audit.com', role='mentor')
+        self.assertEqual(len([s for s in statements if s.startswith('INSERT INTO user_change_log')]), 1)
+        self.assertEqual(self.logged_changes(), {
+            ('first_name', 'Member', 'Ada', self.admin_id),
+            ('email', 'member@audit.com', 'ada@audit.com', self.admin_id),
+            ('role', 'mentee', 'mentor', self.admin_id),
+        })
+
+        self.edit_member(first_name='Ada', email='ada@audit.com', role='mentor')
+        self.assertEqual(len(self.logged_changes()), 3)
+
+    def test_async_writer(self):
+        """With AUDIT_ASYNC the rows are written by the background thread"""
+        app.config['AUDIT_ASYNC'] = True
+        self.edit_member(last_name='Lovelace')
+        audit_writer.flush()
+        self.assertEqual(self.logged_changes(), {('last_name', 'User', 'Lovelace', self.admin_id)})
+
+    def test_full_queue_writes_inline(self):
+        """A full queue falls back to writing in the caller instead of dropping rows"""
+        writer = AuditWriter(maxsize=1)
+        writer._ensure_started = lambda app: None  # no consumer: the queue stays full
+        rows = change_log_rows(self.member_id, self.admin_id, [('first_name', 'Member', 'Ada')])
+        with app.app_context():
+            self.assertTrue(writer.enqueue(app, rows))
+            self.assertFalse(writer.enqueue(app, rows))
+        self.assertEqual(len(self.logged_changes()), 1)
+
+    def create_history(self, count, start=datetime(2024, 1, 1), step=timedelta(hours=1)):
+        """count change rows for the member by the admin, one per step"""
+        with app.app_context():
+            insert_change_logs([
+                dict(row, updated_at=start + i * step)
+                for i, row in enumerate(change_log_rows(
+                    self.member_id, self.admin_id, [('first_name', f'old{i}', f'new{i}') for i in range(count)]))
+            ])
+            db.session.commit()
+
+    def test_history_view_pages_newest_first(self):
+        """Per-user history pages with cursors and one query per page"""
+        self.create_history(5)
+        html = self.client.get(f'/admin/audit?user_id={self.member_id}&per_page=2').data.decode()
+        self.assertIn('History: Member User', html)
+        self.assertIn('new4', html)
+        self.assertNotIn('new2', html)
+        self.assertIn(f'user_id={self.member_id}', html)
+
+        with app.app_context():
+            with count_queries('user_change_log') as statements:
+                self.client.get(f'/admin/audit?by={self.admin_id}')
+        self.assertEqual(len(statements), 1)
+
+    def test_history_queries_use_indexes(self):
+        """Both filters are index range scans ordered by the index"""
+        self.create_history(3)
+        with app.app_context():
+            for query in (history_query(user_id=self.member_id), history_query(actor_id=self.admin_id)):
+                query = query.order_by(UserChangeLog.updated_at.desc(), UserChangeLog.id.desc())
+                compiled = query.statement.compile(db.engine, compile_kwargs={'literal_binds': True})
+                plan = [row[-1] for row in db.session.connection().exec_driver_sql(
+                    f'EXPLAIN QUERY PLAN {compiled}').fetchall()]
+                self.assertTrue([d for d in plan if 'USING INDEX ix_user_change_log_' in d], plan)
+                self.assertFalse([d for d in plan if 'TEMP B-TREE' in d], plan)
+
+    def test_history_api(self):
+        """The API returns JSON items and a cursor for the next page"""
+        self.create_history(3)
+        data = self.client.get(f'/admin/api/audit?user_id={self.member_id}&per_page=2').get_json()
+        self.assertEqual([item['new_value'] for item in data['items']], ['new2', 'new1'])
+        self.assertEqual(data['items'][0]['updated_by']['username'], 'admin_audit')
+        data = self.client.get(f"/admin/api/audit?user_id={self.member_id}&after={data['next_cursor']}").get_json()
+        self.assertEqual([item['new_value'] for item in data['items']], ['new0'])
+        self.assertIsNone(data['next_cursor'])
+        self.assertEqual(self.client.get('/admin/api/audit?after=junk').status_code, 400)
+
+    def test_compaction_moves_old_rows_by_month(self):
+        """Old entries move to per-month archive tables; recent ones stay"""
+        self.create_history(6, start=datetime(2023, 11, 20), step=timedelta(days=15))
+        with app.app_context():
+            moved = archive_change_logs(datetime(2024, 1, 15))
+            self.assertEqual(moved, {'user_change_log_archive_2023_11': 1,
+                                     'user_change_log_archive_2023_12': 2,
+                                     'user_change_log_archive_2024_01': 1})
+            remaining = [log.new_value for log in UserChangeLog.query.order_by(UserChangeLog.id)]
+            self.assertEqual(remaining, ['new4', 'new5'])
+            archived = db.session.execute(audit.archive_table(2023, 12).select()).all()
+            self.assertEqual(sorted(row.new_value for row in archived), ['new1', 'new2'])
+
+        result = app.test_cli_runner().invoke(args=['audit', 'compact', '--older-than', '0'])
+        self.assertIn('Archived 2 change log row(s)', result.output)
+
+
+if __name__ == '__main__':
+    unittest.main()
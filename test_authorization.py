@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Tests for viewer-scope authorization
+
+Covers:
+- All eight page scopes for role, admin, match and self viewers
+- One match query per batch of pages
+- view_page and navigation menus use the engine
+- Forms share the same checks, including the available-forms listing
+"""
+
+import unittest
+from app import app, db
+from models import User, UserRole, Page, Match, ViewerScope, Form
+from authorization import filter_visible, can_view, scope_permits, available_forms
+from identity import Viewer
+from matches import invalidate_matched_ids
+from navigation import nav_index
+from test_request_caching import count_queries
+
+
+class AuthorizationTest(unittest.TestCase):
+
+    def setUp(self):
+        """Set up test environment"""
+        app.config['TESTING'] = True
+        app.config['WTF_CSRF_ENABLED'] = False
+        self.client = app.test_client()
+        invalidate_matched_ids()
+        nav_index.invalidate()
+
+        with app.app_context():
+            db.create_all()
+            users = {
+                'admin': User(username='admin_auth', email='admin@auth.com', first_name='Admin',
+                              last_name='User', is_admin=True, role=UserRole.MENTEE),
+                'mentor': User(username='mentor_auth', email='mentor@auth.com', first_name='Mentor',
+                               last_name='User', role=UserRole.MENTOR),
+                'mentee': User(username='mentee_auth', email='mentee@auth.com', first_name='Mentee',
+                               last_name='User', role=UserRole.MENTEE),
+                'loner': User(username='loner_auth', email='loner@auth.com', first_name='Loner',
+                              last_name='User', role=UserRole.BOTH),
+            }
+            db.session.add_all(users.values())
+            db.session.flush()
+            db.session.add(Match(mentor_id=users['mentor'].id, mentee_id=users['mentee'].id))
+            for scope in ViewerScope:
+                db.session.add(Page(title=scope.value, slug=scope.value.replace('_', '-'),
+                                    content='Body', viewer_scope=scope,
+                                    created_by_id=users['admin'].id))
+            db.session.commit()
+            self.ids = {name: user.id for name, user in users.items()}
+
+    def tearDown(self):
+        """Clean up test environment"""
+        invalidate_matched_ids()
+        nav_index.invalidate()
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def visible_scopes(self, name):
+        with app.app_context():
+            viewer = Viewer.from_user(db.session.get(User, self.ids[name]))
+            return {page.viewer_scope for page in filter_visible(viewer, Page.query.all())}
+
+    def test_scope_matrix(self):
+        """Each viewer sees exactly the scopes that apply to them"""
+        self.assertEqual(self.visible_scopes('admin'), {
+            ViewerScope.ALL_USERS, ViewerScope.ADMINS_ONLY, ViewerScope.MENTEES_ONLY, ViewerScope.SELF_ONLY,
+        })
+        self.assertEqual(self.visible_scopes('mentor'), {
+            ViewerScope.ALL_USERS, ViewerScope.MENTORS_ONLY, ViewerScope.MATCHED_PAIR, ViewerScope.MENTOR_OF,
+        })
+        self.assertEqual(self.visible_scopes('mentee'), {
+            ViewerScope.ALL_USERS, ViewerScope.MENTEES_ONLY, ViewerScope.MATCHED_PAIR, ViewerScope.MENTEE_OF,
+        })
+        self.assertEqual(self.visible_scopes('loner'), {
+            ViewerScope.ALL_USERS, ViewerScope.MENTORS_ONLY, ViewerScope.MENTEES_ONLY,
+        })
+
+    def test_batch_costs_one_match_query(self):
+        """A whole batch of pages needs a single match lookup"""
+        with app.app_context():
+            viewer = Viewer.from_user(db.session.get(User, self.ids['mentor']))
+            pages = Page.query.all() * 10
+            with count_queries('match') as statements:
+                filter_visible(viewer, pages)
+                can_view(viewer, pages[0])
+            self.assertEqual(len(statements), 1)
+
+    def test_view_page_allows_match_scope(self):
+        """Mentors can open MENTOR_OF pages; unmatched users are turned away"""
+        with self.client.session_transaction() as sess:
+            sess.clear()
+            sess['user_id'] = self.ids['mentor']
+        response = self.client.get('/page/mentor-of')
+        self.assertEqual(response.status_code, 200)
+
+        with self.client.session_transaction() as sess:
+            sess.clear()
+            sess['user_id'] = self.ids['loner']
+        response = self.client.get('/page/mentor-of')
+        self.assertEqual(response.status_code, 302)
+
+    def test_navigation_includes_dynamic_scopes(self):
+        """The menu lists match and self pages the viewer qualifies for"""
+        with self.client.session_transaction() as sess:
+            sess.clear()
+            sess['user_id'] = self.ids['mentee']
+        html = self.client.get('/dashboard').data.decode()
+        self.assertIn('/page/mentee-of', html)
+        self.assertIn('/page/matched-pair', html)
+        self.assertNotIn('/page/mentor-of', html)
+        self.assertNotIn('/page/self-only', html)
+
+    def create_forms(self, *scopes):
+        with app.app_context():
+            for scope in scopes:
+                db.session.add(Form(title=scope.value, slug=scope.value.replace('_', '-'),
+                                    fields=[{'type': 'text', 'label': 'Name', 'name': 'name'}],
+                                    viewer_scope=scope, created_by_id=self.ids['admin']))
+            db.session.commit()
+
+    def test_scope_permits_table(self):
+        """The role lookup table agrees with the role rules"""
+        self.assertTrue(scope_permits(UserRole.MENTOR, False, ViewerScope.MENTORS_ONLY))
+        self.assertFalse(scope_permits(UserRole.MENTOR, False, ViewerScope.MENTEES_ONLY))
+        self.assertTrue(scope_permits(UserRole.BOTH, False, ViewerScope.MENTEES_ONLY))
+        self.assertTrue(scope_permits(UserRole.MENTEE, True, ViewerScope.ADMINS_ONLY))
+        self.assertFalse(scope_permits(UserRole.BOTH, True, ViewerScope.MATCHED_PAIR))
+
+    def test_form_view_uses_shared_check(self):
+        """Forms are gated by the same engine as pages"""
+        self.create_forms(ViewerScope.MENTORS_ONLY, ViewerScope.MENTEE_OF)
+        with self.client.session_transaction() as sess:
+            sess.clear()
+            sess['user_id'] = self.ids['mentee']
+        self.assertEqual(self.client.get('/form/mentors-only').status_code, 403)
+        self.assertEqual(self.client.post('/form/mentors-only/submit').status_code, 403)
+        self.assertEqual(self.client.get('/form/mentee-of').status_code, 200)
+
+    def test_available_forms_listing(self):
+        """The forms page lists only active forms the user may open"""
+        self.create_forms(ViewerScope.ALL_USERS, ViewerScope.MENTORS_ONLY,
+                          ViewerScope.ADMINS_ONLY, ViewerScope.MATCHED_PAIR)
+        with app.app_context():
+            viewer = Viewer.from_user(db.session.get(User, self.ids['mentor']))
+            slugs = {form.slug for form in available_forms(viewer)}
+        self.assertEqual(slugs, {'all-users', 'mentors-only', 'matched-pair'})
+
+        with self.client.session_transaction() as sess:
+            sess.clear()
+            sess['user_id'] = self.ids['loner']
+        html = self.client.get('/forms').data.decode()
+        self.assertIn('/form/all-users', html)
+        self.assertNotIn('/form/matched-pair', html)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Tests for bulk data commands
+
+Covers:
+- flask users import (CSV and JSONL, deduplication, change logs)
+- flask matches import/assign (role checks, capacity, answer overlap)
+- Streaming submission export (CSV/JSONL, CLI and admin endpoint)
+"""
+
+import csv
+import io
+import json
+import os
+import tempfile
+import unittest
+from app import app, db
+from models import User, UserRole, UserChangeLog, Match, Form, Submission
+from bulk_import import import_users
+from exports import stream_export
+from matching import greedy_assign
+from matches import invalidate_matched_ids, matched_ids
+
+
+class BulkOperationsTest(unittest.TestCase):
+
+    def setUp(self):
+        """Set up test environment"""
+        app.config['TESTING'] = True
+        self.runner = app.test_cli_runner()
+
+        with app.app_context():
+            db.create_all()
+            admin = User(username='admin_bulk', email='admin@bulk.com', first_name='Admin',
+                         last_name='User', is_admin=True, role=UserRole.BOTH)
+            existing = User(username='taken', email='taken@bulk.com', first_name='Taken',
+                            last_name='User', role=UserRole.MENTEE)
+            db.session.add_all([admin, existing])
+            db.session.commit()
+            self.admin_id = admin.id
+
+    def tearDown(self):
+        """Clean up test environment"""
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def write_file(self, suffix, content):
+        handle, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(handle, 'w') as f:
+            f.write(content)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_import_csv_deduplicates_and_logs(self):
+        """New users are inserted once each, with one change log row apiece"""
+        path = self.write_file('.csv', '\n'.join([
+            'username,email,first_name,last_name,role',
+            'Ada,ada@bulk.com,Ada,Lovelace,mentor',
+            'grace,grace@bulk.com,Grace,Hopper,both',
+            'taken,other@bulk.com,Dup,Name,mentee',
+            'newname,TAKEN@bulk.com,Dup,Email,mentee',
+            'ada,ada2@bulk.com,Dup,InFile,mentee',
+            'broken,,No,Email,mentee',
+            'weird,weird@bulk.com,Bad,Role,wizard',
+        ]))
+        result = self.runner.invoke(args=['users', 'import', path, '--batch-size', '1'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn('7 read, 2 inserted, 3 duplicate, 2 invalid', result.output)
+
+        with app.app_context():
+            ada = User.query.filter_by(username='ada').one()
+            self.assertEqual(ada.role, UserRole.MENTOR)
+            self.assertFalse(ada.is_admin)
+            self.assertEqual(User.query.count(), 4)
+            logs = UserChangeLog.query.all()
+            self.assertEqual(len(logs), 2)
+            self.assertTrue(all(log.updated_by == self.admin_id for log in logs))
+
+    def test_import_jsonl_stream(self):
+        """JSONL records import in batches and report progress per batch"""
+        lines = [json.dumps({'username': f'user{i}', 'email': f'user{i}@bulk.com',
+                             'first_name': 'User', 'last_name': str(i)}) for i in range(25)]
+        reports = []
+        with app.app_context():
+            stats = import_users(io.StringIO('\n'.join(lines)), 'jsonl', self.admin_id,
+                                 source='test', batch_size=10, progress=lambda s: reports.append(s.inserted))
+            self.assertEqual(stats.inserted, 25)
+            self.assertEqual(reports, [10, 20, 25])
+            self.assertEqual(User.query.filter(User.username.like('user%')).count(), 25)
+
+    def test_import_jsonl_skips_malformed_lines(self):
+        """Bad JSON, non-object lines and non-string values count as invalid"""
+        lines = [
+            json.dumps({'username': 'good1', 'email': 'good1@bulk.com', 'first_name': 'G', 'last_name': '1'}),
+            '{"username": "broken",',
+            '[1, 2]',
+            json.dumps({'username': 5, 'email': 'five@bulk.com', 'first_name': 'F', 'last_name': 'V'}),
+            json.dumps({'username': 'bad', 'email': 'bad@bulk.com', 'first_name': 'B', 'last_name': 'R', 'role': 3}),
+            json.dumps({'username': 'good2', 'email': 'good2@bulk.com', 'first_name': 'G', 'last_name': '2'}),
+        ]
+        with app.app_context():
+            stats = import_users(io.StringIO('\n'.join(lines)), 'jsonl', self.admin_id, source='test', batch_size=1)
+            self.assertEqual((stats.read, stats.inserted, stats.invalid), (6, 3, 3))
+            self.assertEqual(db.session.get(User, User.query.filter_by(email='five@bulk.com').one().id).username, '5')
+
+    def test_dry_run_writes_nothing(self):
+        """--dry-run validates without inserting"""
+        path = self.write_file('.jsonl', json.dumps({
+            'username': 'ada', 'email': 'ada@bulk.com', 'first_name': 'Ada', 'last_name': 'L'}))
+        result = self.runner.invoke(args=['users', 'import', path, '--dry-run'])
+        self.assertIn('1 valid', result.output)
+        with app.app_context():
+            self.assertEqual(User.query.count(), 2)
+
+    def create_people(self, mentors, mentees):
+        with app.app_context():
+            users = [User(username=f'mentor{i}', email=f'mentor{i}@bulk.com', first_name='Mentor',
+                          last_name=str(i), role=UserRole.MENTOR) for i in range(mentors)]
+            users += [User(username=f'mentee{i}', email=f'mentee{i}@bulk.com', first_name='Mentee',
+                           last_name=str(i), role=UserRole.MENTEE) for i in range(mentees)]
+            db.session.add_all(users)
+            db.session.commit()
+            return {user.username: user.id for user in users}
+
+    def test_import_pairs_validates_roles(self):
+        """Pairing files skip unknown users, wrong roles and duplicates"""
+        ids = self.create_people(1, 2)
+        path = self.write_file('.csv', '\n'.join([
+            'mentor,mentee',
+            'mentor0,mentee0',
+            'MENTOR0@bulk.com,mentee1',
+            'mentor0,mentee0',
+            'mentee0,mentee1',
+            'mentor0,nobody',
+        ]))
+        with app.app_context():
+            matched_ids(ids['mentor0'])
+        result = self.runner.invoke(args=['matches', 'import', path])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn('2 match(es) created, 3 skipped', result.output)
+        self.assertIn('mentor does not have a mentor role', result.output)
+
+        with app.app_context():
+            self.assertEqual(Match.query.count(), 2)
+            # Cached partner sets were dropped after the write
+            self.assertEqual(matched_ids(ids['mentor0']).mentee_ids, {ids['mentee0'], ids['mentee1']})
+        invalidate_matched_ids()
+
+    def test_assign_respects_capacity(self):
+        """Every mentor gets at most --capacity mentees, least-loaded first"""
+        # Three mentors (the admin is BOTH) for seven mentees
+        self.create_people(2, 5)
+        result = self.runner.invoke(args=['matches', 'assign', '--capacity', '2', '--dry-run'])
+        self.assertIn('6 match(es) planned, 1 skipped', result.output)
+        with app.app_context():
+            self.assertEqual(Match.query.count(), 0)
+
+        result = self.runner.invoke(args=['matches', 'assign', '--capacity', '2'])
+        self.assertIn('6 match(es) created', result.output)
+        with app.app_context():
+            loads = db.session.query(Match.mentor_id, db.func.count()).group_by(Match.mentor_id).all()
+            self.assertEqual(sorted(count for _, count in loads), [2, 2, 2])
+            self.assertFalse(Match.query.filter(Match.mentor_id == Match.mentee_id).count())
+
+    def test_assign_prefers_shared_answers(self):
+        """With forms, mentees go to the mentor who gave the same answers"""
+        ids = self.create_people(2, 2)
+        fields = [{'type': 'select', 'label': 'Topic', 'name': 'topic', 'options': ['web', 'data']}]
+        with app.app_context():
+            mentor_form = Form(title='Mentors', slug='mentors', fields=fields, created_by_id=self.admin_id)
+            mentee_form = Form(title='Mentees', slug='mentees', fields=fields, created_by_id=self.admin_id)
+            db.session.add_all([mentor_form, mentee_form])
+            db.session.flush()
+            for name, form, topic in (('mentor0', mentor_form, 'web'), ('mentor1', mentor_form, 'data'),
+                                      ('mentee0', mentee_form, 'data'), ('mentee1', mentee_form, 'web')):
+                db.session.add(Submission(form_id=form.id, user_id=ids[name], responses={'topic': topic}))
+            db.session.commit()
+
+        result = self.runner.invoke(args=['matches', 'assign', '--capacity', '1',
+                                          '--mentor-form', 'mentors', '--mentee-form', 'mentees'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        with app.app_context():
+            pairs = set(db.session.query(Match.mentor_id, Match.mentee_id))
+        self.assertEqual(pairs, {(ids['mentor0'], ids['mentee1']), (ids['mentor1'], ids['mentee0'])})
+        invalidate_matched_ids()
+
+    def test_greedy_never_pairs_user_with_self(self):
+        """A BOTH user in both pools is matched to someone else"""
+        pairs = greedy_assign({1: 1, 2: 1}, [1, 3])
+        self.assertNotIn((1, 1), pairs)
+        self.assertEqual(len(pairs), 2)
+
+    def create_submissions(self, count):
+        fields = [
+            {'type': 'text', 'label': 'Name', 'name': 'full_name'},
+            {'type': 'checkbox', 'label': 'Skills', 'name': 'skills', 'options': ['python', 'sql']},
+            {'type': 'select', 'label': 'Track', 'name': 'track', 'options': ['web', 'data']},
+        ]
+        ids = self.create_people(0, count)
+        with app.app_context():
+            form = Form(title='Export', slug='export', fields=fields, created_by_id=self.admin_id)
+            db.session.add(form)
+            db.session.flush()
+            for i in range(count):
+                db.session.add(Submission(form_id=form.id, user_id=ids[f'mentee{i}'], responses={
+                    'track': 'data', 'skills': ['python', 'sql'], 'full_name': f'Mentee, {i}', 'stale': 'x'}))
+            db.session.commit()
+            return form.id
+
+    def test_export_streams_in_chunks(self):
+        """Exports are generated chunk by chunk with columns in field order"""
+        form_id = self.create_submissions(25)
+        with app.app_context():
+            chunks = list(stream_export(db.session.get(Form, form_id), 'csv', chunk_size=10))
+        self.assertEqual(len(chunks), 3)
+
+        rows = list(csv.reader(io.StringIO(''.join(chunks))))
+        self.assertEqual(rows[0], ['submission_id', 'submitted_at', 'username', 'email',
+                                   'full_name', 'skills', 'track'])
+        self.assertEqual(len(rows), 26)
+        self.assertEqual(rows[1][2:], ['mentee0', 'mentee0@bulk.com', 'Mentee, 0', 'python; sql', 'data'])
+
+    def test_export_csv_neutralizes_formulas(self):
+        """Answers a spreadsheet would evaluate are quoted in CSV but not in JSONL"""
+        form_id = self.create_submissions(1)
+        with app.app_context():
+            submission = Submission.query.filter_by(form_id=form_id).one()
+            submission.responses = {'full_name': '=HYPERLINK("http://x")', 'skills': ['-1', 'sql'], 'track': '@data'}
+            db.session.commit()
+            form = db.session.get(Form, form_id)
+            rows = list(csv.reader(io.StringIO(''.join(stream_export(form, 'csv')))))
+            record = json.loads(''.join(stream_export(form, 'jsonl')))
+        self.assertEqual(rows[1][4:], ['\'=HYPERLINK("http://x")', "'-1; sql", "'@data"])
+        self.assertEqual(record['full_name'], '=HYPERLINK("http://x")')
+
+    def test_export_cli_jsonl(self):
+        """flask forms export writes one JSON object per submission"""
+        self.create_submissions(3)
+        result = self.runner.invoke(args=['forms', 'export', 'export', '--format', 'jsonl'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        records = [json.loads(line) for line in result.output.splitlines()]
+        self.assertEqual(len(records), 3)
+        self.assertEqual(records[0]['skills'], ['python', 'sql'])
+        self.assertNotIn('stale', records[0])
+
+        result = self.runner.invoke(args=['forms', 'export', 'missing'])
+        self.assertNotEqual(result.exit_code, 0)
+
+    def test_export_endpoint_is_admin_only(self):
+        """The download streams for admins and redirects everyone else"""
+        form_id = self.create_submissions(2)
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess.clear()
+            sess['user_id'] = self.admin_id
+        response = client.get(f'/admin/forms/{form_id}/export.csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_streamed)
+        self.assertIn('export-submissions.csv', response.headers['Content-Disposition'])
+        self.assertEqual(len(response.get_data(as_text=True).splitlines()), 3)
+        self.assertEqual(client.get(f'/admin/forms/{form_id}/export.xml').status_code, 404)
+
+        with app.app_context():
+            mentee_id = User.query.filter_by(username='mentee0').one().id
+        with client.session_transaction() as sess:
+            sess.clear()
+            sess['user_id'] = mentee_id
+        self.assertEqual(client.get(f'/admin/forms/{form_id}/export.csv').status_code, 302)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -61,6 +61,7 @@ class FormBuilderE2ETest(unittest.TestCase):
     def login_admin(self):
         """Helper to login as admin"""
         with self.client.session_transaction() as sess:
+            sess.clear()
             sess['user_id'] = self.admin_user.id
             sess['username'] = self.admin_user.username
             sess['first_name'] = self.admin_user.first_name
@@ -69,6 +70,7 @@ class FormBuilderE2ETest(unittest.TestCase):
     def login_user(self):
         """Helper to login as regular user"""
         with self.client.session_transaction() as sess:
+            sess.clear()
             sess['user_id'] = self.regular_user.id
             sess['username'] = self.regular_user.username
             sess['first_name'] = self.regular_user.first_name
@@ -299,6 +301,7 @@ class FormBuilderE2ETest(unittest.TestCase):
             db.session.commit()
             
             with self.client.session_transaction() as sess:
+                sess.clear()
                 sess['user_id'] = new_user.id
                 sess['username'] = new_user.username
                 sess['first_name'] = new_user.first_name
@@ -0,0 +1,578 @@
+#!/usr/bin/env python3
+"""
+Tests for query counts on list and relationship-heavy views
+
+Covers:
+- Admin forms list submission counts
+- Denormalized Form.submission_count maintenance
+- Indexed submission answers and their backfill
+- Admin submission browser filters, projection and query count
+- Incrementally maintained form statistics
+- Keyset pagination of the admin user list
+- Single-statement login upserts
+- Eager-loaded mentor/mentee match pages
+- Indexed match lookups and cached partner sets
+"""
+
+import re
+import unittest
+from unittest import mock
+from datetime import datetime, timedelta
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from app import app, db
+from models import User, UserRole, Form, FormStats, Submission, SubmissionAnswer, ViewerScope, Match
+from test_request_caching import count_queries
+from commands import reconcile_submission_counts
+from form_stats import field_summaries
+from pagination import keyset_paginate, decode_cursor
+from matches import matched_ids, invalidate_matched_ids
+import accounts
+import pagination
+
+
+class QueryEfficiencyTest(unittest.TestCase):
+
+    def setUp(self):
+        """Set up test environment"""
+        app.config['TESTING'] = True
+        app.config['WTF_CSRF_ENABLED'] = False
+        self.client = app.test_client()
+        invalidate_matched_ids()
+
+        with app.app_context():
+            db.create_all()
+            admin = User(username='admin_query', email='admin@query.com',
+                         first_name='Admin', last_name='User',
+                         is_admin=True, role=UserRole.BOTH)
+            db.session.add(admin)
+            db.session.commit()
+            self.admin_id = admin.id
+
+    def tearDown(self):
+        """Clean up test environment"""
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def login(self, user_id):
+        with self.client.session_transaction() as sess:
+            sess.clear()
+            sess['user_id'] = user_id
+
+    def create_users(self, count, role=UserRole.MENTEE, prefix='member'):
+        with app.app_context():
+            users = [User(username=f'{prefix}{i}', email=f'{prefix}{i}@query.com',
+                          first_name='Member', last_name=str(i), role=role)
+                     for i in range(count)]
+            db.session.add_all(users)
+            db.session.commit()
+            return [user.id for user in users]
+
+    def create_form(self, slug, submitter_ids=()):
+        with app.app_context():
+            form = Form(title=slug.title(), slug=slug,
+                        fields=[{'type': 'text', 'label': 'Name', 'name': 'name'}],
+                        viewer_scope=ViewerScope.ALL_USERS, created_by_id=self.admin_id)
+            db.session.add(form)
+            db.session.flush()
+            for user_id in submitter_ids:
+                db.session.add(Submission(user_id=user_id, form_id=form.id, responses={'name': 'x'}))
+            db.session.commit()
+            return form.id
+
+    def test_admin_forms_counts_without_submission_queries(self):
+        """Submission counts are read from the form row"""
+        user_ids = self.create_users(3)
+        self.create_form('busy', user_ids)
+        self.create_form('quiet', user_ids[:1])
+        self.create_form('empty')
+        with app.app_context():
+            reconcile_submission_counts()
+        self.login(self.admin_id)
+
+        with count_queries('submission') as statements:
+            response = self.client.get('/admin/forms')
+        html = response.data.decode()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(statements, [])
+        self.assertIn('<span class="badge bg-primary">3</span>', html)
+        self.assertIn('<span class="badge bg-primary">1</span>', html)
+        self.assertIn('<span class="badge bg-primary">0</span>', html)
+        # Only the empty form can be deleted
+        self.assertEqual(html.count('/delete"'), 1)
+
+    def test_submit_form_increments_counter(self):
+        """Each submission bumps the counter without touching updated_at"""
+        form_id = self.create_form('intake')
+        with app.app_context():
+            updated_at = db.session.get(Form, form_id).updated_at
+        for user_id in self.create_users(2):
+            self.login(user_id)
+            self.client.post('/form/intake/submit', data={'name': 'Ada'})
+        with app.app_context():
+            form = db.session.get(Form, form_id)
+            self.assertEqual(form.submission_count, 2)
+            self.assertEqual(form.updated_at, updated_at)
+
+    def test_reconcile_command_fixes_drift(self):
+        """flask forms reconcile-counts recomputes counts from submissions"""
+        user_ids = self.create_users(2)
+        form_id = self.create_form('intake', user_ids)
+        result = app.test_cli_runner().invoke(args=['forms', 'reconcile-counts'])
+        self.assertIn('Corrected submission_count on 1 form(s).', result.output)
+        with app.app_context():
+            self.assertEqual(db.session.get(Form, form_id).submission_count, 2)
+
+    def test_schema_sync_counts_existing_submissions(self):
+        """Adding submission_count to an older database fills in the real counts"""
+        form_id = self.create_form('intake', self.create_users(2))
+        with app.app_context():
+            db.session.execute(text('ALTER TABLE form DROP COLUMN submission_count'))
+            db.session.commit()
+        result = app.test_cli_runner().invoke(args=['schema', 'sync'])
+        self.assertIn('Added column(s) to form: submission_count', result.output)
+        self.assertIn('Corrected submission_count on 1 form(s).', result.output)
+        with app.app_context():
+            self.assertEqual(db.session.get(Form, form_id).submission_count, 2)
+
+    def test_delete_blocked_by_counter(self):
+        """admin_delete_form uses the counter to refuse deleting forms in use"""
+        form_id = self.create_form('intake', self.create_users(1))
+        with app.app_context():
+            reconcile_submission_counts()
+        self.login(self.admin_id)
+        self.client.post(f'/admin/forms/{form_id}/delete')
+        with app.app_context():
+            self.assertIsNotNone(db.session.get(Form, form_id))
+
+    def create_skills_form(self):
+        with app.app_context():
+            form = Form(title='Skills', slug='skills', created_by_id=self.admin_id, fields=[
+                {'type': 'text', 'label': 'Name', 'name': 'name'},
+                {'type': 'checkbox', 'label': 'Skills', 'name': 'skills',
+                 'options': ['Python', 'SQL', 'Go'], 'max_selections': 3},
+            ])
+            db.session.add(form)
+            db.session.commit()
+            return form.id
+
+    def test_submit_form_indexes_answers(self):
+        """Submissions write one answer row per value in the same transaction"""
+        form_id = self.create_skills_form()
+        user_id = self.create_users(1)[0]
+        self.login(user_id)
+        self.client.post('/form/skills/submit', data={'name': ' Ada ', 'skills': ['Python', 'SQL']})
+        with app.app_context():
+            answers = {(a.field_name, a.value) for a in SubmissionAnswer.query.filter_by(form_id=form_id)}
+            self.assertEqual(answers, {('name', 'Ada'), ('skills', 'Python'), ('skills', 'SQL')})
+            ids = db.session.execute(SubmissionAnswer.submission_ids(form_id, 'skills', 'SQL')).scalars().all()
+            self.assertEqual(ids, [Submission.query.one().id])
+
+    def test_backfill_answers_command(self):
+        """Existing submissions are indexed once; re-running adds nothing"""
+        form_id = self.create_skills_form()
+        with app.app_context():
+            for i, user_id in enumerate(self.create_users(5)):
+                db.session.add(Submission(user_id=user_id, form_id=form_id,
+                                          responses={'name': f'n{i}', 'skills': ['Go'] if i % 2 else []}))
+            db.session.commit()
+
+        runner = app.test_cli_runner()
+        result = runner.invoke(args=['forms', 'backfill-answers', '--batch-size', '2'])
+        self.assertIn('Indexed 7 answer(s) from 5 submission(s).', result.output)
+        result = runner.invoke(args=['forms', 'backfill-answers'])
+        self.assertIn('Indexed 0 answer(s) from 0 submission(s).', result.output)
+
+        with app.app_context():
+            query = SubmissionAnswer.submission_ids(form_id, 'skills', 'Go')
+            self.assertEqual(len(db.session.execute(query).all()), 2)
+            compiled = query.compile(db.engine, compile_kwargs={'literal_binds': True})
+            plan = db.session.connection().exec_driver_sql(f'EXPLAIN QUERY PLAN {compiled}').fetchall()
+            self.assertIn('USING COVERING INDEX ix_submission_answer_lookup', plan[0][-1])
+
+    def create_browsable_submissions(self):
+        """Skills form with six submissions from mentors and mentees, indexed"""
+        form_id = self.create_skills_form()
+        with app.app_context():
+            form = db.session.get(Form, form_id)
+            form.fields = form.fields + [{'type': 'textarea', 'label': 'Story', 'name': 'story'}]
+            db.session.commit()
+        user_ids = self.create_users(3, role=UserRole.MENTOR, prefix='mentor') + self.create_users(3)
+        start = datetime(2024, 1, 1)
+        with app.app_context():
+            for i, user_id in enumerate(user_ids):
+                db.session.add(Submission(user_id=user_id, form_id=form_id, created_at=start + timedelta(hours=i),
+                                          responses={'name': f'person{i}', 'story': 'long ' * 500,
+                                                     'skills': ['Python', 'SQL'] if i % 2 else ['Go']}))
+            db.session.commit()
+        app.test_cli_runner().invoke(args=['forms', 'backfill-answers'])
+        return form_id
+
+    def test_submission_browser_queries(self):
+        """A page costs a fixed number of queries and never loads full responses"""
+        form_id = self.create_browsable_submissions()
+        self.login(self.admin_id)
+        self.client.get(f'/admin/forms/{form_id}/submissions')
+        with app.app_context():
+            with count_queries('submission') as statements:
+                html = self.client.get(f'/admin/forms/{form_id}/submissions?per_page=4').data.decode()
+        self.assertEqual(len(statements), 2)
+        # Only the listed fields are extracted; the whole JSON column never is
+        self.assertFalse([s for s in statements if re.search(r'(SELECT|,)\s*submission\.responses\s*(,|FROM)', s)])
+        self.assertEqual(statements[1].count('JSON_EXTRACT'), 2)
+        self.assertIn('person5', html)
+        self.assertNotIn('person1<', html)
+        self.assertNotIn('long long', html)
+        self.assertIn('Older', html)
+
+    def test_submission_browser_filters(self):
+        """Answer and role filters narrow the list and survive paging"""
+        form_id = self.create_browsable_submissions()
+        self.login(self.admin_id)
+        url = f'/admin/forms/{form_id}/submissions'
+        html = self.client.get(f'{url}?answer.skills=Python&role=mentee').data.decode()
+        self.assertEqual(re.findall(r'person\d', html), ['person5', 'person3'])
+
+        html = self.client.get(f'{url}?answer.skills=Python&per_page=1').data.decode()
+        self.assertEqual(re.findall(r'person\d', html), ['person5'])
+        next_url = re.search(r'href="([^"]*after=[^"]*)"', html).group(1).replace('&amp;', '&')
+        self.assertIn('answer.skills=Python', next_url)
+        html = self.client.get(next_url).data.decode()
+        self.assertEqual(re.findall(r'person\d', html), ['person3'])
+
+        self.assertEqual(self.client.get(f'{url}?role=wizard').status_code, 400)
+
+    def test_submission_detail_loads_full_answers(self):
+        """Expanding a row fetches the complete responses"""
+        form_id = self.create_browsable_submissions()
+        self.login(self.admin_id)
+        with app.app_context():
+            submission_id = Submission.query.first().id
+        html = self.client.get(f'/admin/forms/{form_id}/submissions/{submission_id}').data.decode()
+        self.assertIn('long long', html)
+        self.assertEqual(self.client.get(f'/admin/forms/{form_id + 1}/submissions/{submission_id}').status_code, 404)
+
+    def test_form_stats_incremental_matches_rebuild(self):
+        """submit_form keeps the stats row equal to a full rebuild"""
+        form_id = self.create_skills_form()
+        answers = [{'name': 'Ada', 'skills': ['Python', 'SQL']}, {'name': 'Grace Hopper', 'skills': ['Python']},
+                   {'name': '', 'skills': []}]
+        for user_id, data in zip(self.create_users(3), answers):
+            self.login(user_id)
+            self.client.post('/form/skills/submit', data=data)
+
+        with app.app_context():
+            stats = db.session.get(FormStats, form_id).stats
+            self.assertEqual(stats['submissions'], 3)
+            self.assertEqual(stats['fields']['skills'], {'answered': 2, 'options': {'Python': 2, 'SQL': 1}})
+            self.assertEqual(stats['fields']['name']['answered'], 2)
+            self.assertEqual(stats['fields']['name']['length_max'], 12)
+
+        result = app.test_cli_runner().invoke(args=['forms', 'rebuild-stats', 'skills'])
+        self.assertIn('skills: 3 submission(s)', result.output)
+        with app.app_context():
+            self.assertEqual(db.session.get(FormStats, form_id).stats, stats)
+
+    def test_new_form_starts_with_empty_stats(self):
+        """The stats row is created with the form, so submissions never insert it"""
+        form_id = self.create_skills_form()
+        with app.app_context():
+            self.assertEqual(db.session.get(FormStats, form_id).stats, {})
+        self.login(self.create_users(1)[0])
+        with count_queries() as statements:
+            self.client.post('/form/skills/submit', data={'name': 'Ada', 'skills': ['Go']})
+        self.assertEqual([s for s in statements if s.startswith('INSERT INTO form_stats')], [])
+        with app.app_context():
+            self.assertEqual(db.session.get(FormStats, form_id).stats['submissions'], 1)
+
+    def test_submission_without_stats_row_skips_stats(self):
+        """Forms predating form_stats are backfilled by schema sync, not in the request"""
+        form_id = self.create_skills_form()
+        with app.app_context():
+            FormStats.query.delete()
+            db.session.commit()
+        self.login(self.create_users(1)[0])
+        with count_queries('submission') as statements:
+            self.client.post('/form/skills/submit', data={'name': 'Ada', 'skills': ['Go']})
+        self.assertEqual([s for s in statements if s.startswith('SELECT submission.responses')], [])
+        with app.app_context():
+            self.assertIsNone(db.session.get(FormStats, form_id))
+            self.assertEqual(Submission.query.count(), 1)
+
+        result = app.test_cli_runner().invoke(args=['schema', 'sync'])
+        self.assertIn('Built statistics for skills: 1 submission(s)', result.output)
+        with app.app_context():
+            self.assertEqual(db.session.get(FormStats, form_id).stats['fields']['skills'],
+                             {'answered': 1, 'options': {'Go': 1}})
+
+    def test_stats_failure_keeps_submission(self):
+        """An error while updating stats is logged and the submission still commits"""
+        form_id = self.create_skills_form()
+        self.login(self.create_users(1)[0])
+        with mock.patch('routes.record_submission', side_effect=OperationalError('UPDATE', {}, Exception('locked'))):
+            response = self.client.post('/form/skills/submit', data={'name': 'Ada', 'skills': ['Go']})
+        self.assertIn(b'submitted successfully', response.data)
+        with app.app_context():
+            self.assertEqual(db.session.get(Form, form_id).submission_count, 1)
+            self.assertEqual(SubmissionAnswer.query.count(), 2)
+
+    def test_form_edit_rebuilds_stats_for_new_field_types(self):
+        """Changing a field's type rebuilds the stats, and stale entries still render"""
+        form_id = self.create_skills_form()
+        self.login(self.create_users(1)[0])
+        self.client.post('/form/skills/submit', data={'name': 'Ada', 'skills': ['Go']})
+        with app.app_context():
+            form = db.session.get(Form, form_id)
+            stale = db.session.get(FormStats, form_id).stats
+            form.fields = [{'type': 'textarea', 'label': 'Skills', 'name': 'skills'}]
+            self.assertEqual(field_summaries(form, stale)[0]['length_avg'], 0)
+
+        self.login(self.admin_id)
+        self.client.post(f'/admin/forms/{form_id}/edit', data={
+            'title': 'Skills', 'slug': 'skills', 'viewer_scope': 'all_users', 'is_active': 'y',
+            'fields_json': '[{"type": "select", "label": "Name", "name": "name", "options": ["Ada"]},'
+                           ' {"type": "textarea", "label": "Skills", "name": "skills"}]',
+        })
+        with app.app_context():
+            stats = db.session.get(FormStats, form_id).stats
+        self.assertEqual(stats['fields']['name'], {'answered': 1, 'options': {'Ada': 1}})
+        self.assertNotIn('options', stats['fields']['skills'])
+        self.assertEqual(self.client.get(f'/admin/forms/{form_id}/stats').status_code, 200)
+
+    def test_form_stats_page_single_query(self):
+        """The stats page reads the form and its stats in one query"""
+        form_id = self.create_skills_form()
+        for user_id in self.create_users(2):
+            self.login(user_id)
+            self.client.post('/form/skills/submit', data={'name': 'Ada', 'skills': ['Go']})
+        self.login(self.admin_id)
+        self.client.get(f'/admin/forms/{form_id}/stats')
+        with app.app_context():
+            with count_queries('form') as statements:
+                html = self.client.get(f'/admin/forms/{form_id}/stats').data.decode()
+        self.assertEqual(len(statements), 1)
+        self.assertIn('2 submission(s)', html)
+        self.assertIn('100% answered', html)
+        self.assertEqual(self.client.get(f'/admin/forms/{form_id + 1}/stats').status_code, 404)
+
+    def create_dated_users(self, count):
+        start = datetime(2025, 1, 1)
+        with app.app_context():
+            for i in range(count):
+                db.session.add(User(username=f'dated{i}', email=f'dated{i}@query.com',
+                                    first_name='Dated', last_name=str(i),
+                                    created_at=start + timedelta(days=i // 2)))
+            db.session.commit()
+
+    def test_keyset_pages_walk_forward_and_back(self):
+        """Cursors visit every user once, newest first, in both directions"""
+        self.create_dated_users(7)
+        with app.app_context():
+            expected = [u.username for u in User.query.order_by(User.created_at.desc(), User.id.desc())]
+            seen = []
+            pages = []
+            after = None
+            while True:
+                page = keyset_paginate(User.query, User.created_at, User.id, 3, after=after)
+                pages.append([u.username for u in page.items])
+                seen.extend(pages[-1])
+                if not page.has_next:
+                    break
+                after = page.next_cursor
+            self.assertEqual(seen, expected)
+            self.assertEqual(len(pages), 3)
+
+            back = keyset_paginate(User.query, User.created_at, User.id, 3, before=page.prev_cursor)
+            self.assertEqual([u.username for u in back.items], pages[-2])
+            self.assertTrue(back.has_next)
+
+    def test_admin_users_paginates(self):
+        """The admin list renders one page with a link to the next"""
+        self.create_dated_users(5)
+        pagination._row_counts.clear()
+        self.login(self.admin_id)
+        response = self.client.get('/admin/users?per_page=2')
+        html = response.data.decode()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(html.count('/edit"'), 2)
+        self.assertIn('All Users (about 6)', html)
+        cursor = re.search(r'after=([\w-]+)', html).group(1)
+        with app.app_context():
+            decode_cursor(cursor)
+        response = self.client.get(f'/admin/users?per_page=2&after={cursor}')
+        self.assertEqual(response.data.decode().count('/edit"'), 2)
+
+    def test_admin_users_rejects_bad_cursor(self):
+        """Malformed cursors are a client error"""
+        self.login(self.admin_id)
+        response = self.client.get('/admin/users?after=not-a-cursor')
+        self.assertEqual(response.status_code, 400)
+
+    def sign_in(self, username, email, first_name='Member', last_name='User'):
+        return self.client.post('/login', data={'username': username, 'email': email,
+                                                'first_name': first_name, 'last_name': last_name})
+
+    def test_login_creates_user_in_one_statement(self):
+        """A sign-up is one INSERT ... ON CONFLICT, with no user count"""
+        accounts._bootstrapped = True
+        with count_queries() as statements:
+            response = self.sign_in('newcomer', 'newcomer@query.com')
+        self.assertEqual(response.status_code, 302)
+        statements = [s for s in statements if 'session_record' not in s]
+        self.assertEqual(len(statements), 1)
+        self.assertIn('ON CONFLICT', statements[0])
+        self.assertNotIn('count(', statements[0])
+        with app.app_context():
+            user = User.query.filter_by(username='newcomer').one()
+            self.assertFalse(user.is_admin)
+            self.assertEqual(user.role, UserRole.MENTEE)
+            self.assertEqual(user.created_at, user.last_login)
+
+    def test_login_updates_existing_user(self):
+        """Returning users keep their role and admin flag; names and last_login refresh"""
+        [member_id] = self.create_users(1, role=UserRole.MENTOR)
+        with self.client:
+            self.sign_in('renamed', 'member0@query.com', first_name='Ada')
+            self.assertEqual(self.client.get('/dashboard').status_code, 200)
+        self.client = app.test_client()
+        with count_queries() as statements:
+            self.sign_in('renamed', 'new@query.com', first_name='Grace')
+        with app.app_context():
+            user = db.session.get(User, member_id)
+            self.assertEqual((user.username, user.email, user.first_name), ('renamed', 'new@query.com', 'Grace'))
+            self.assertEqual(user.role, UserRole.MENTOR)
+            self.assertIsNotNone(user.last_login)
+            self.assertEqual(User.query.count(), 2)
+        # The email conflict misses, so the username conflict is retried
+        self.assertEqual(len([s for s in statements if 'ON CONFLICT' in s]), 2)
+
+    def test_first_user_becomes_admin(self):
+        """Until the bootstrap flag is set, the INSERT itself checks for existing users"""
+        with app.app_context():
+            User.query.delete()
+            db.session.commit()
+        accounts._bootstrapped = False
+        self.sign_in('founder', 'founder@query.com')
+        self.client = app.test_client()
+        with count_queries() as statements:
+            self.sign_in('second', 'second@query.com')
+        self.assertNotIn('EXISTS', statements[0])
+        with app.app_context():
+            admins = {user.username: user.is_admin for user in User.query}
+        self.assertEqual(admins, {'founder': True, 'second': False})
+
+    def create_matches(self, mentor_id, mentee_ids, is_active=True):
+        with app.app_context():
+            for mentee_id in mentee_ids:
+                db.session.add(Match(mentor_id=mentor_id, mentee_id=mentee_id, is_active=is_active))
+            db.session.commit()
+
+    def test_my_mentees_single_query(self):
+        """All active mentees load in one query, inactive ones are skipped"""
+        mentor_id = self.create_users(1, role=UserRole.MENTOR, prefix='mentor')[0]
+        mentee_ids = self.create_users(25)
+        self.create_matches(mentor_id, mentee_ids[:24])
+        self.create_matches(mentor_id, mentee_ids[24:], is_active=False)
+        self.login(mentor_id)
+        self.client.get('/dashboard')
+
+        with count_queries() as statements:
+            response = self.client.get('/my-mentees')
+        html = response.data.decode()
+        # Besides the session's version check
+        self.assertEqual(len([s for s in statements if 'session_record' not in s]), 1)
+        self.assertIn('member23@query.com', html)
+        self.assertNotIn('member24@query.com', html)
+
+    def test_my_mentor_uses_active_match(self):
+        """The mentee page shows the active mentor with a single LIMIT 1 query"""
+        old_mentor, new_mentor = self.create_users(2, role=UserRole.MENTOR, prefix='mentor')
+        mentee_id = self.create_users(1)[0]
+        self.create_matches(old_mentor, [mentee_id], is_active=False)
+        self.create_matches(new_mentor, [mentee_id])
+        self.login(mentee_id)
+
+        with count_queries() as statements:
+            response = self.client.get('/my-mentor')
+        statements = [s for s in statements if 'match' in s]
+        self.assertEqual(len(statements), 1)
+        self.assertIn('LIMIT', statements[0])
+        self.assertIn('mentor1@query.com', response.data.decode())
+
+    def test_user_match_helpers_filter_inactive(self):
+        """get_active_matches_as_* ignore ended matches"""
+        mentor_id = self.create_users(1, role=UserRole.MENTOR, prefix='mentor')[0]
+        mentee_ids = self.create_users(2)
+        self.create_matches(mentor_id, mentee_ids[:1])
+        self.create_matches(mentor_id, mentee_ids[1:], is_active=False)
+        with app.app_context():
+            mentor = db.session.get(User, mentor_id)
+            matches = mentor.get_active_matches_as_mentor()
+            self.assertEqual([m.mentee.id for m in matches], mentee_ids[:1])
+            mentee = db.session.get(User, mentee_ids[1])
+            self.assertEqual(mentee.get_active_matches_as_mentee(), [])
+
+    def test_is_matched_with_uses_indexes(self):
+        """Both directions are answered by seeks on the partial indexes"""
+        mentor_id = self.create_users(1, role=UserRole.MENTOR, prefix='mentor')[0]
+        mentee_id, ended_id = self.create_users(2)
+        self.create_matches(mentor_id, [mentee_id])
+        self.create_matches(mentor_id, [ended_id], is_active=False)
+        with app.app_context():
+            mentor = db.session.get(User, mentor_id)
+            mentee = db.session.get(User, mentee_id)
+            ended = db.session.get(User, ended_id)
+            with count_queries('match') as statements:
+                self.assertTrue(mentor.is_matched_with(mentee))
+            self.assertTrue(mentee.is_matched_with(mentor))
+            self.assertFalse(mentor.is_matched_with(ended))
+
+            plan = db.session.connection().exec_driver_sql(
+                'EXPLAIN QUERY PLAN ' + statements[0], (mentor_id, mentee_id, mentee_id, mentor_id)
+            ).fetchall()
+            details = [row[-1] for row in plan]
+            self.assertFalse([d for d in details if d.startswith('SCAN match')])
+            self.assertEqual(len([d for d in details if 'USING INDEX ix_match_' in d]), 2)
+
+    def test_is_matched_with_uses_cached_partner_sets(self):
+        """Once the partner sets are cached the check runs no match query"""
+        app.config['MATCH_CACHE_TTL'] = 60
+        mentor_id = self.create_users(1, role=UserRole.MENTOR, prefix='mentor')[0]
+        mentee_id, other_id = self.create_users(2)
+        self.create_matches(mentor_id, [mentee_id])
+        with app.app_context():
+            mentor = db.session.get(User, mentor_id)
+            mentee = db.session.get(User, mentee_id)
+            other = db.session.get(User, other_id)
+            matched_ids(mentor_id)
+            with count_queries('match') as statements:
+                self.assertTrue(mentor.is_matched_with(mentee))
+                self.assertFalse(mentor.is_matched_with(other))
+            self.assertEqual(statements, [])
+        app.config['MATCH_CACHE_TTL'] = 30
+
+    def test_matched_ids_cached_per_user(self):
+        """Partner sets load in one query and are reused until invalidated"""
+        app.config['MATCH_CACHE_TTL'] = 60
+        mentor_id = self.create_users(1, role=UserRole.BOTH, prefix='mentor')[0]
+        mentee_ids = self.create_users(3)
+        self.create_matches(mentor_id, mentee_ids[:2])
+        self.create_matches(mentee_ids[2], [mentor_id])
+        with app.app_context():
+            with count_queries('match') as statements:
+                ids = matched_ids(mentor_id)
+                self.assertIs(matched_ids(mentor_id), ids)
+            self.assertEqual(len(statements), 1)
+            self.assertEqual(ids.mentee_ids, frozenset(mentee_ids[:2]))
+            self.assertEqual(ids.mentor_ids, frozenset(mentee_ids[2:]))
+
+            self.create_matches(mentor_id, [self.admin_id])
+            self.assertNotIn(self.admin_id, matched_ids(mentor_id).mentee_ids)
+            invalidate_matched_ids(mentor_id)
+            self.assertIn(self.admin_id, matched_ids(mentor_id).mentee_ids)
+        app.config['MATCH_CACHE_TTL'] = 30
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Tests for content and label rendering
+
+Covers:
+- Pooled Markdown engines produce the same HTML as fresh ones
+- Engine state does not leak between documents
+- Color span sanitizing
+"""
+
+import threading
+import unittest
+import markdown
+from rendering import MarkdownPool, process_content, MARKDOWN_EXTENSIONS
+
+
+class ProcessContentTest(unittest.TestCase):
+
+    def test_matches_fresh_engine(self):
+        """Pooled output is identical to a newly built engine"""
+        samples = [
+            "# Title\n\nSome **bold** text",
+            "| a | b |\n|---|---|\n| 1 | 2 |",
+            "```\ncode block\n```",
+            "line one\nline two",
+        ]
+        for sample in samples:
+            expected = markdown.Markdown(extensions=MARKDOWN_EXTENSIONS).convert(sample)
+            self.assertEqual(process_content(sample), expected)
+
+    def test_reference_links_do_not_leak(self):
+        """reset() clears link references between documents"""
+        process_content("[guide][1]\n\n[1]: https://example.com")
+        html = process_content("[guide][1]")
+        self.assertNotIn('https://example.com', html)
+
+    def test_color_spans_are_normalized(self):
+        """Allowed color spans are rewritten to a canonical form"""
+        html = process_content('<span style="color:#ff0000" >Red</span>')
+        self.assertIn('<span style="color: #ff0000">Red</span>', html)
+
+    def test_pool_is_thread_safe(self):
+        """Concurrent callers never share an engine"""
+        pool = MarkdownPool(size=2)
+        results = []
+
+        def render(i):
+            with pool.engine() as md:
+                results.append(md.convert(f"# Heading {i}") == f"<h1>Heading {i}</h1>")
+
+        threads = [threading.Thread(target=render, args=(i,)) for i in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, [True] * 20)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,458 @@
+#!/usr/bin/env python3
+"""
+Tests for per-request and process-level caching
+
+Covers:
+- Viewer identity shared by decorators, views and templates
+- Cache invalidation on login and admin edits
+- Navigation page index used by inject_user
+- Rendered page HTML cached per page version
+- Processed form labels cached per form version
+- Dashboard counts from one query, cached until a counted write
+- Server-side sessions behind an opaque cookie id
+"""
+
+import unittest
+from unittest import mock
+from contextlib import contextmanager
+from datetime import datetime
+from sqlalchemy import event
+from app import app, db
+from models import User, UserRole, Page, ViewerScope, RenderedPage, Form, Match, SessionRecord
+from navigation import nav_index
+from dashboard import dashboard_metrics, invalidate_dashboard_metrics
+from sessions import session_store, session_key
+import routes
+
+
+@contextmanager
+def count_queries(table=None):
+    """Collect SQL statements run inside the block, optionally for one table"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if table is None or f'FROM {table}' in statement or f'FROM "{table}"' in statement:
+            statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
+class RequestCachingTest(unittest.TestCase):
+
+    def setUp(self):
+        """Set up test environment"""
+        app.config['TESTING'] = True
+        app.config['WTF_CSRF_ENABLED'] = False
+        self.client = app.test_client()
+        nav_index.invalidate()
+        routes._rendered_pages.clear()
+        routes._processed_fields.clear()
+        routes._validation_plans.clear()
+        invalidate_dashboard_metrics()
+
+        with app.app_context():
+            db.create_all()
+            admin = User(username='admin_cache', email='admin@cache.com',
+                         first_name='Admin', last_name='User',
+                         is_admin=True, role=UserRole.BOTH)
+            member = User(username='member_cache', email='member@cache.com',
+                          first_name='Member', last_name='User',
+                          is_admin=False, role=UserRole.MENTEE)
+            db.session.add_all([admin, member])
+            db.session.commit()
+            self.admin_id = admin.id
+            self.member_id = member.id
+
+    def tearDown(self):
+        """Clean up test environment"""
+        app.config['DASHBOARD_CACHE_TTL'] = 30
+        nav_index.invalidate()
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def login(self, user_id):
+        with self.client.session_transaction() as sess:
+            sess.clear()
+            sess['user_id'] = user_id
+
+    def test_admin_page_loads_user_once(self):
+        """admin_required, the view and inject_user share one viewer"""
+        self.login(self.admin_id)
+        with count_queries('user') as statements:
+            response = self.client.get('/admin')
+        self.assertEqual(response.status_code, 200)
+        # Completing the test's bare user_id session into a full identity
+        user_lookups = [s for s in statements if 'user.id = ' in s]
+        self.assertEqual(len(user_lookups), 1)
+
+    def test_viewer_identity_comes_from_session(self):
+        """Once the session holds the identity, authorization reads no user row"""
+        self.login(self.admin_id)
+        self.client.get('/admin')
+        with count_queries('user') as statements:
+            response = self.client.get('/admin')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([s for s in statements if 'user.id = ' in s], [])
+
+    def test_admin_edit_reaches_logged_in_user(self):
+        """Promoting or demoting a user takes effect on their next request"""
+        self.login(self.member_id)
+        response = self.client.get('/admin')
+        self.assertEqual(response.status_code, 302)
+
+        admin_client = app.test_client()
+        with admin_client.session_transaction() as sess:
+            sess.clear()
+            sess['user_id'] = self.admin_id
+        admin_client.post(f'/admin/users/{self.member_id}/edit', data={
+            'first_name': 'Member',
+            'last_name': 'User',
+            'email': 'member@cache.com',
+            'role': 'mentee',
+            'is_admin': 'y',
+        })
+
+        response = self.client.get('/admin')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'adminDropdown', response.data)
+
+        admin_client.post(f'/admin/users/{self.member_id}/edit', data={
+            'first_name': 'Member',
+            'last_name': 'User',
+            'email': 'member@cache.com',
+            'role': 'mentee',
+        })
+        self.assertEqual(self.client.get('/admin').status_code, 302)
+        response = self.client.get('/dashboard')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(b'adminDropdown', response.data)
+
+    def test_deleted_user_is_logged_out(self):
+        """login_required clears the session when the user no longer exists"""
+        self.login(self.member_id)
+        self.assertEqual(self.client.get('/dashboard').status_code, 200)
+        with app.app_context():
+            db.session.delete(db.session.get(User, self.member_id))
+            db.session.commit()
+        response = self.client.get('/my-mentor')
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('/login', response.location)
+
+    def sign_in(self, client, username, email):
+        return client.post('/login', data={'username': username, 'email': email,
+                                           'first_name': 'Member', 'last_name': 'User'})
+
+    def test_anonymous_sessions_stay_in_cookie(self):
+        """Anonymous visits, CSRF tokens and flashes never write session records"""
+        app.config['WTF_CSRF_ENABLED'] = True
+        try:
+            for _ in range(3):
+                self.assertEqual(self.client.get('/login').status_code, 200)
+            self.client.get('/dashboard')  # flashes a warning
+        finally:
+            app.config['WTF_CSRF_ENABLED'] = False
+        self.assertIsNotNone(self.client.get_cookie('session'))
+        self.assertIsNone(self.client.get_cookie('session_id'))
+        with app.app_context():
+            self.assertEqual(SessionRecord.query.count(), 0)
+
+    def test_session_id_cookie_is_opaque(self):
+        """Logging in stores the identity under the hash of a random id"""
+        self.sign_in(self.client, 'member_cache', 'member@cache.com')
+        sid = self.client.get_cookie('session_id').value
+        self.assertNotIn('member', sid)
+        with app.app_context():
+            record = db.session.get(SessionRecord, session_key(sid))
+            self.assertEqual(record.user_id, self.member_id)
+            self.assertEqual(record.data['role'], 'mentee')
+            self.assertNotIn('_flashes', record.data)
+
+        self.client.get('/logout')
+        self.assertIsNone(self.client.get_cookie('session_id'))
+        with app.app_context():
+            self.assertEqual(SessionRecord.query.count(), 0)
+
+    def test_session_served_from_process_cache(self):
+        """Each request checks the record's version only; flashes and reads don't write"""
+        self.sign_in(self.client, 'member_cache', 'member@cache.com')
+        self.client.get('/dashboard')
+        with count_queries() as statements:
+            response = self.client.get('/dashboard')
+            self.client.get('/admin')  # flashes "Admin access required"
+        self.assertEqual(response.status_code, 200)
+        statements = [s for s in statements if 'session_record' in s]
+        self.assertEqual(len(statements), 2)
+        self.assertTrue(all(s.startswith('SELECT session_record.version') for s in statements), statements)
+
+    def test_logout_elsewhere_ends_session(self):
+        """Deleting the record (another worker's logout) ends the session at once"""
+        self.sign_in(self.client, 'member_cache', 'member@cache.com')
+        self.assertEqual(self.client.get('/dashboard').status_code, 200)
+        with app.app_context():
+            SessionRecord.query.delete()
+            db.session.commit()
+        response = self.client.get('/my-mentor')
+        self.assertIn('/login', response.location)
+
+    def test_admin_edit_updates_live_sessions(self):
+        """Every session of the edited user sees the new role on its next request"""
+        clients = [app.test_client(), app.test_client()]
+        for client in clients:
+            self.sign_in(client, 'member_cache', 'member@cache.com')
+        self.login(self.admin_id)
+        self.client.post(f'/admin/users/{self.member_id}/edit', data={
+            'first_name': 'Member', 'last_name': 'User', 'email': 'member@cache.com',
+            'role': 'mentor', 'is_admin': 'y',
+        })
+        for client in clients:
+            with client.session_transaction() as sess:
+                self.assertEqual((sess['role'], sess['is_admin']), ('mentor', True))
+        session_store._cache.clear()
+        with clients[0].session_transaction() as sess:
+            self.assertEqual(sess['role'], 'mentor')
+
+    def test_own_admin_edit_survives_request_save(self):
+        """A request that flashes does not write back the identity it loaded"""
+        self.sign_in(self.client, 'admin_cache', 'admin@cache.com')
+        self.client.post(f'/admin/users/{self.admin_id}/edit', data={
+            'first_name': 'Admin', 'last_name': 'User', 'email': 'admin@cache.com',
+            'role': 'mentor', 'is_admin': 'y',
+        })
+        with self.client.session_transaction() as sess:
+            self.assertEqual(sess['role'], 'mentor')
+            self.assertTrue(sess['_flashes'])
+        with app.app_context():
+            self.assertEqual(SessionRecord.query.one().data['role'], 'mentor')
+
+    def test_expired_sessions_ignored_and_purged(self):
+        """Expired records start a new session and are removed by the purge command"""
+        self.login(self.member_id)
+        with app.app_context():
+            SessionRecord.query.update({'expires_at': datetime(2000, 1, 1)})
+            db.session.commit()
+        response = self.client.get('/dashboard')
+        self.assertIn('/login', response.location)
+        result = app.test_cli_runner().invoke(args=['sessions', 'purge'])
+        self.assertIn('Deleted 1 expired session(s)', result.output)
+
+    def create_page(self, slug, scope, is_published=True):
+        with app.app_context():
+            page = Page(title=slug.title(), slug=slug, content='Hello',
+                        viewer_scope=scope, is_published=is_published,
+                        created_by_id=self.admin_id)
+            db.session.add(page)
+            db.session.commit()
+
+    def test_navigation_index_filters_by_role(self):
+        """Menus only contain published pages the role may view"""
+        self.create_page('everyone', ViewerScope.ALL_USERS)
+        self.create_page('mentors', ViewerScope.MENTORS_ONLY)
+        self.create_page('admins', ViewerScope.ADMINS_ONLY)
+        self.create_page('draft', ViewerScope.ALL_USERS, is_published=False)
+
+        with app.app_context():
+            mentee_slugs = [p.slug for p in nav_index.pages_for(UserRole.MENTEE, False)]
+            admin_slugs = [p.slug for p in nav_index.pages_for(UserRole.BOTH, True)]
+        self.assertEqual(mentee_slugs, ['everyone'])
+        self.assertEqual(admin_slugs, ['everyone', 'mentors', 'admins'])
+
+    def test_navigation_index_skips_page_scan(self):
+        """Rendering the menu again does not query the page table"""
+        self.create_page('everyone', ViewerScope.ALL_USERS)
+        self.login(self.member_id)
+        self.client.get('/dashboard')
+        with count_queries('page') as statements:
+            response = self.client.get('/dashboard')
+        self.assertIn(b'/page/everyone', response.data)
+        self.assertEqual(statements, [])
+
+    def test_navigation_index_rebuilt_after_page_admin(self):
+        """Creating a page through the admin shows it in the menu"""
+        self.login(self.admin_id)
+        self.client.get('/dashboard')
+        self.client.post('/admin/pages/new', data={
+            'title': 'Fresh Guide',
+            'slug': 'fresh-guide',
+            'content': 'Content',
+            'viewer_scope': 'all_users',
+            'is_published': 'y',
+        })
+        response = self.client.get('/dashboard')
+        self.assertIn(b'/page/fresh-guide', response.data)
+
+    def save_page_as_admin(self, slug, content, page_id=None):
+        url = f'/admin/pages/{page_id}/edit' if page_id else '/admin/pages/new'
+        with self.client.session_transaction() as sess:
+            sess.clear()
+            sess['user_id'] = self.admin_id
+        self.client.post(url, data={
+            'title': 'Guide',
+            'slug': slug,
+            'content': content,
+            'viewer_scope': 'all_users',
+            'is_published': 'y',
+        })
+        with app.app_context():
+            return Page.query.filter_by(slug=slug).one().id
+
+    def test_dashboard_counts_in_one_query(self):
+        """Every dashboard metric comes from a single aggregate SELECT"""
+        self.login(self.admin_id)
+        with app.app_context():
+            db.session.add_all([
+                Page(title='Live', slug='live', content='x', created_by_id=self.admin_id),
+                Page(title='Draft', slug='draft', content='x', is_published=False, created_by_id=self.admin_id),
+                Match(mentor_id=self.admin_id, mentee_id=self.member_id),
+                Form(title='Intake', slug='intake', fields=[], submission_count=3, created_by_id=self.admin_id),
+            ])
+            db.session.commit()
+        with count_queries() as statements:
+            response = self.client.get('/admin')
+        self.assertEqual(response.status_code, 200)
+        counts = [s for s in statements if 'count(*)' in s]
+        self.assertEqual(len(counts), 1)
+        self.assertIn('FILTER (WHERE', counts[0])
+        with app.app_context():
+            metrics = dashboard_metrics()
+        self.assertEqual((metrics['users_total'], metrics['users_mentee'], metrics['users_both'],
+                          metrics['users_admin']), (2, 1, 1, 1))
+        self.assertEqual((metrics['pages_published'], metrics['pages_draft']), (1, 1))
+        self.assertEqual(metrics['matches_active'], 1)
+        self.assertEqual((metrics['forms_active'], metrics['submissions_total']), (1, 3))
+
+    def test_dashboard_cached_until_counted_write(self):
+        """Reloads skip the aggregate; only writes to counted columns refresh it"""
+        self.login(self.admin_id)
+        self.client.get('/admin')
+        with count_queries() as statements:
+            self.client.get('/admin')
+        self.assertEqual([s for s in statements if 'count(*)' in s], [])
+
+        with app.app_context():
+            member = db.session.get(User, self.member_id)
+            member.last_login = datetime.utcnow()
+            db.session.commit()
+            self.assertEqual(dashboard_metrics()['users_mentee'], 1)
+            member.role = UserRole.MENTOR
+            db.session.commit()
+            self.assertEqual(dashboard_metrics()['users_mentee'], 0)
+
+            db.session.execute(db.insert(Match), [{'mentor_id': self.member_id, 'mentee_id': self.admin_id}])
+            db.session.rollback()
+            self.assertEqual(dashboard_metrics()['matches_active'], 0)
+            db.session.execute(db.insert(Match), [{'mentor_id': self.member_id, 'mentee_id': self.admin_id}])
+            db.session.commit()
+            self.assertEqual(dashboard_metrics()['matches_active'], 1)
+
+    def test_saved_page_is_never_rendered_on_read(self):
+        """Saving a page fills the cache so views skip markdown entirely"""
+        self.save_page_as_admin('onboarding', '# Welcome')
+        with mock.patch('routes.process_content', wraps=routes.process_content) as render:
+            first = self.client.get('/page/onboarding')
+            second = self.client.get('/page/onboarding')
+        self.assertIn(b'<h1>Welcome</h1>', first.data)
+        self.assertIn(b'<h1>Welcome</h1>', second.data)
+        render.assert_not_called()
+
+    def test_persisted_html_survives_memory_eviction(self):
+        """A cold process reads the rendered_page row instead of re-rendering"""
+        self.save_page_as_admin('onboarding', '# Welcome')
+        routes._rendered_pages.clear()
+        with mock.patch('routes.process_content', wraps=routes.process_content) as render:
+            response = self.client.get('/page/onboarding')
+        self.assertIn(b'<h1>Welcome</h1>', response.data)
+        render.assert_not_called()
+
+    def test_editing_page_replaces_rendered_html(self):
+        """A new updated_at makes the old HTML unreachable"""
+        page_id = self.save_page_as_admin('onboarding', '# Welcome')
+        self.save_page_as_admin('onboarding', '# Updated', page_id=page_id)
+        response = self.client.get('/page/onboarding')
+        self.assertIn(b'<h1>Updated</h1>', response.data)
+        self.assertNotIn(b'Welcome', response.data)
+        with app.app_context():
+            self.assertEqual(RenderedPage.query.count(), 1)
+
+    def test_legacy_page_rendered_once_on_first_view(self):
+        """Pages created outside the admin are rendered lazily and persisted"""
+        self.create_page('legacy', ViewerScope.ALL_USERS)
+        self.login(self.member_id)
+        with mock.patch('routes.process_content', wraps=routes.process_content) as render:
+            self.client.get('/page/legacy')
+            routes._rendered_pages.clear()
+            response = self.client.get('/page/legacy')
+        self.assertIn(b'Hello', response.data)
+        self.assertEqual(render.call_count, 1)
+
+    def test_deleting_page_removes_rendered_html(self):
+        """The rendered_page row goes with its page"""
+        page_id = self.save_page_as_admin('onboarding', '# Welcome')
+        self.client.post(f'/admin/pages/{page_id}/delete')
+        with app.app_context():
+            self.assertEqual(Page.query.count(), 0)
+            self.assertEqual(RenderedPage.query.count(), 0)
+
+    def create_form(self, labels):
+        fields = [{'id': f'field_{i}', 'type': 'text', 'name': f'field_{i}', 'label': label}
+                  for i, label in enumerate(labels)]
+        with app.app_context():
+            form = Form(title='Intake', slug='intake', fields=fields,
+                        viewer_scope=ViewerScope.ALL_USERS, created_by_id=self.admin_id)
+            db.session.add(form)
+            db.session.commit()
+            return form.id
+
+    def test_form_labels_processed_once_per_version(self):
+        """Repeated GETs reuse the processed field list"""
+        self.create_form(['**Name**', '*Bio*', '[Site](https://example.com)'])
+        self.login(self.member_id)
+        with mock.patch('routes.process_form_label', wraps=routes.process_form_label) as label:
+            first = self.client.get('/form/intake')
+            second = self.client.get('/form/intake')
+        self.assertIn(b'<strong>Name</strong>', first.data)
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(label.call_count, 3)
+
+    def test_form_edit_invalidates_processed_labels(self):
+        """admin_edit_form makes the new labels visible immediately"""
+        form_id = self.create_form(['**Name**'])
+        self.login(self.admin_id)
+        self.client.get('/form/intake')
+        self.client.post(f'/admin/forms/{form_id}/edit', data={
+            'title': 'Intake',
+            'slug': 'intake',
+            'viewer_scope': 'all_users',
+            'is_active': 'y',
+            'fields_json': '[{"id": "field_0", "type": "text", "name": "field_0", "label": "**Full name**"}]',
+        })
+        response = self.client.get('/form/intake')
+        self.assertIn(b'<strong>Full name</strong>', response.data)
+
+    def test_validation_plan_reused_and_reports_all_errors(self):
+        """Submissions share one compiled plan and flash every error"""
+        form_id = self.create_form(['Name'])
+        with app.app_context():
+            form = db.session.get(Form, form_id)
+            form.fields = [
+                {'type': 'text', 'label': 'Name', 'name': 'name', 'required': True},
+                {'type': 'email', 'label': 'Email', 'name': 'email', 'required': True},
+            ]
+            db.session.commit()
+        self.login(self.member_id)
+        with mock.patch('routes.ValidationPlan', wraps=routes.ValidationPlan) as compile_plan:
+            self.client.post('/form/intake/submit', data={'email': 'bad'})
+            response = self.client.post('/form/intake/submit', data={'email': 'bad'})
+        self.assertEqual(compile_plan.call_count, 1)
+        self.assertIn(b'Name is required.', response.data)
+        self.assertIn(b'Email: Please enter a valid email address.', response.data)
+
+
+if __name__ == '__main__':
+    unittest.main()
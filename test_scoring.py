@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Tests for vectorized compatibility scoring
+
+Covers:
+- One-hot encoding of select and checkbox answers
+- Mentor x mentee matrix agrees with counting shared answers pair by pair
+- Top-k candidates per mentee, field weights and self-exclusion
+- The pure-Python fallback ranks mentors the same way
+"""
+
+import random
+import unittest
+from app import app, db
+from models import User, UserRole, Form, Submission
+from matching import overlap_candidates
+import scoring
+
+FIELDS = [
+    {'type': 'select', 'label': 'Track', 'name': 'track', 'options': ['web', 'data', 'design']},
+    {'type': 'checkbox', 'label': 'Skills', 'name': 'skills', 'options': ['python', 'sql', 'js', 'css']},
+    {'type': 'text', 'label': 'Bio', 'name': 'bio'},
+]
+
+
+@unittest.skipIf(scoring.np is None, 'numpy is not installed')
+class ScoringTest(unittest.TestCase):
+
+    def setUp(self):
+        """Set up test environment"""
+        app.config['TESTING'] = True
+        with app.app_context():
+            db.create_all()
+            admin = User(username='admin_score', email='admin@score.com', first_name='Admin',
+                         last_name='User', is_admin=True, role=UserRole.BOTH)
+            db.session.add(admin)
+            db.session.flush()
+            self.admin_id = admin.id
+            mentor_form = Form(title='Mentors', slug='mentors', fields=FIELDS, created_by_id=admin.id)
+            mentee_form = Form(title='Mentees', slug='mentees', fields=FIELDS, created_by_id=admin.id)
+            db.session.add_all([mentor_form, mentee_form])
+            db.session.commit()
+            self.mentor_form_id = mentor_form.id
+            self.mentee_form_id = mentee_form.id
+
+    def tearDown(self):
+        """Clean up test environment"""
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def submit(self, form_id, answers):
+        """Create one user per answer dict and submit it; returns their ids"""
+        ids = []
+        for answer in answers:
+            n = User.query.count()
+            user = User(username=f'user{n}', email=f'user{n}@score.com',
+                        first_name='Test', last_name='User', role=UserRole.BOTH)
+            db.session.add(user)
+            db.session.flush()
+            db.session.add(Submission(form_id=form_id, user_id=user.id, responses=answer))
+            ids.append(user.id)
+        db.session.commit()
+        return ids
+
+    def forms(self):
+        return db.session.get(Form, self.mentor_form_id), db.session.get(Form, self.mentee_form_id)
+
+    def random_answers(self, count, rng):
+        return [{'track': rng.choice(['web', 'data', 'design']),
+                 'skills': rng.sample(['python', 'sql', 'js', 'css'], rng.randint(0, 3)),
+                 'bio': 'free text is ignored'} for _ in range(count)]
+
+    def test_one_hot_encoding(self):
+        """Choice answers become one column each; text fields are skipped"""
+        with app.app_context():
+            self.submit(self.mentor_form_id, [{'track': 'data', 'skills': ['sql', 'python'], 'bio': 'x'}])
+            mentor_ids, mentors, _, mentees, vocabulary = scoring.answer_matrices(*self.forms())
+            self.assertEqual(mentors.shape, (1, 7))
+            self.assertEqual(mentees.shape, (0, 7))
+            hot = {key for key, column in vocabulary.columns.items() if mentors[0, column]}
+            self.assertEqual(hot, {('track', 'data'), ('skills', 'sql'), ('skills', 'python')})
+
+    def test_matrix_matches_pairwise_count(self):
+        """Every cell equals the number of answers the pair shares"""
+        rng = random.Random(7)
+        with app.app_context():
+            mentor_answers = self.random_answers(12, rng)
+            mentee_answers = self.random_answers(30, rng)
+            self.submit(self.mentor_form_id, mentor_answers)
+            self.submit(self.mentee_form_id, mentee_answers)
+            _, _, scores = scoring.compatibility_matrix(*self.forms())
+
+        def tokens(answer):
+            return {('track', answer['track'])} | {('skills', skill) for skill in answer['skills']}
+
+        self.assertEqual(scores.shape, (12, 30))
+        for i, mentor in enumerate(mentor_answers):
+            for j, mentee in enumerate(mentee_answers):
+                self.assertEqual(scores[i, j], len(tokens(mentor) & tokens(mentee)))
+
+    def test_top_candidates_and_weights(self):
+        """Top-k is ordered by score and field weights change the ranking"""
+        with app.app_context():
+            web, sql = self.submit(self.mentor_form_id, [
+                {'track': 'web', 'skills': []},
+                {'track': 'data', 'skills': ['sql', 'python']},
+            ])
+            [mentee] = self.submit(self.mentee_form_id, [{'track': 'web', 'skills': ['sql', 'python']}])
+            ranked = scoring.top_candidates(*self.forms(), k=2)
+            self.assertEqual(ranked[mentee], [(2.0, sql), (1.0, web)])
+
+            ranked = scoring.top_candidates(*self.forms(), k=1, weights={'track': 5.0})
+            self.assertEqual(ranked[mentee], [(5.0, web)])
+
+    def test_user_never_scored_against_themselves(self):
+        """A user who filled in both forms is not their own candidate"""
+        answer = {'track': 'web', 'skills': ['js']}
+        with app.app_context():
+            [both] = self.submit(self.mentor_form_id, [answer])
+            db.session.add(Submission(form_id=self.mentee_form_id, user_id=both, responses=answer))
+            db.session.commit()
+            self.assertEqual(scoring.top_candidates(*self.forms())[both], [])
+
+    def test_fallback_agrees(self):
+        """The bitset fallback gives the same scores as the vectorized path"""
+        rng = random.Random(11)
+        with app.app_context():
+            mentor_ids = self.submit(self.mentor_form_id, self.random_answers(40, rng))
+            mentee_ids = self.submit(self.mentee_form_id, self.random_answers(25, rng))
+            vectorized = scoring.top_candidates(*self.forms(), mentor_ids, mentee_ids, k=5)
+            fallback = overlap_candidates(*self.forms(), mentor_ids, mentee_ids, top_k=5)
+        for mentee_id in mentee_ids:
+            self.assertEqual([score for score, _ in vectorized[mentee_id]],
+                             [float(score) for score, _ in fallback[mentee_id]])
+
+
+if __name__ == '__main__':
+    unittest.main()
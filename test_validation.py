@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Tests for compiled form validation plans
+
+Covers:
+- Field rules match the original submit_form checks
+- All errors are collected in one pass
+- Plans are reused per form version
+"""
+
+import unittest
+from werkzeug.datastructures import MultiDict
+from validation import ValidationPlan
+
+FIELDS = [
+    {'type': 'text', 'label': 'Short Name', 'name': 'short_name', 'required': True,
+     'min_length': 5, 'max_length': 10},
+    {'type': 'email', 'label': 'Email', 'name': 'email', 'required': True},
+    {'type': 'url', 'label': 'Website', 'name': 'website', 'required': False},
+    {'type': 'checkbox', 'label': 'Skills', 'name': 'skills', 'max_selections': 2,
+     'options': ['Python', 'JavaScript', 'Design']},
+]
+
+
+class ValidationPlanTest(unittest.TestCase):
+
+    def setUp(self):
+        self.plan = ValidationPlan(FIELDS)
+
+    def test_valid_submission(self):
+        """Valid data yields responses and no errors"""
+        responses, errors = self.plan.run(MultiDict([
+            ('short_name', ' TestName '),
+            ('email', 'test@example.com'),
+            ('website', ''),
+            ('skills', 'Python'),
+            ('skills', 'Design'),
+        ]))
+        self.assertEqual(errors, [])
+        self.assertEqual(responses, {
+            'short_name': 'TestName',
+            'email': 'test@example.com',
+            'website': '',
+            'skills': ['Python', 'Design'],
+        })
+
+    def test_collects_every_error(self):
+        """Each invalid field reports its own message"""
+        _, errors = self.plan.run(MultiDict([
+            ('short_name', 'Hi'),
+            ('email', 'invalid-email'),
+            ('website', 'not-a-url'),
+            ('skills', 'Python'),
+            ('skills', 'JavaScript'),
+            ('skills', 'Design'),
+        ]))
+        self.assertEqual(errors, [
+            'Short Name: Must be at least 5 characters long.',
+            'Email: Please enter a valid email address.',
+            'Website: Please enter a valid URL (starting with http:// or https://).',
+            'Skills: Maximum 2 selection(s) allowed.',
+        ])
+
+    def test_required_and_max_length(self):
+        """Missing required values and overlong text are rejected"""
+        _, errors = self.plan.run(MultiDict([('short_name', 'x' * 11)]))
+        self.assertEqual(errors, [
+            'Short Name: Must not exceed 10 characters.',
+            'Email is required.',
+        ])
+
+    def test_required_checkbox(self):
+        """Required checkbox groups need at least one selection"""
+        plan = ValidationPlan([{'type': 'checkbox', 'label': 'Goals', 'name': 'goals', 'required': True}])
+        _, errors = plan.run(MultiDict())
+        self.assertEqual(errors, ['Goals is required.'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import re
+
+EMAIL_PATTERN = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+URL_PATTERN = re.compile(r'^https?://.+\..+')
+
+
+class FieldRule:
+    """Validation for one form field, with limits and patterns resolved up front"""
+
+    __slots__ = ('name', 'label', 'multiple', 'required', 'max_selections',
+                 'min_length', 'max_length', 'pattern', 'pattern_message')
+
+    def __init__(self, field):
+        field_type = field.get('type', 'text')
+        self.name = field['name']
+        self.label = field.get('label', '')
+        self.multiple = field_type == 'checkbox'
+        self.required = bool(field.get('required', False))
+        self.max_selections = field.get('max_selections', 1)
+        self.min_length = None
+        self.max_length = None
+        self.pattern = None
+        self.pattern_message = None
+
+        # Character length validation for text fields
+        if field_type in ['text', 'textarea']:
+            self.min_length = field.get('min_length') or None
+            self.max_length = field.get('max_length') or None
+        elif field_type == 'email':
+            self.pattern = EMAIL_PATTERN
+            self.pattern_message = 'Please enter a valid email address.'
+        elif field_type == 'url':
+            self.pattern = URL_PATTERN
+            self.pattern_message = 'Please enter a valid URL (starting with http:// or https://).'
+
+    def check(self, form_data):
+        """Return (value, error) for this field; error is None when valid"""
+        if self.multiple:
+            # Get all selected values for checkbox groups
+            values = form_data.getlist(self.name)
+            if len(values) > self.max_selections:
+                return values, f'{self.label}: Maximum {self.max_selections} selection(s) allowed.'
+            if self.required and not values:
+                return values, f'{self.label} is required.'
+            return values, None
+
+        value = form_data.get(self.name, '').strip()
+        if not value:
+            return value, f'{self.label} is required.' if self.required else None
+        if self.min_length and len(value) < self.min_length:
+            return value, f'{self.label}: Must be at least {self.min_length} characters long.'
+        if self.max_length and len(value) > self.max_length:
+            return value, f'{self.label}: Must not exceed {self.max_length} characters.'
+        if self.pattern is not None and not self.pattern.match(value):
+            return value, f'{self.label}: {self.pattern_message}'
+        return value, None
+
+
+class ValidationPlan:
+    """Compiled validation for a form's field definitions"""
+
+    __slots__ = ('rules',)
+
+    def __init__(self, fields):
+        self.rules = tuple(FieldRule(field) for field in fields)
+
+    def run(self, form_data):
+        """Validate submitted data in one pass, returning (responses, errors)"""
+        responses = {}
+        errors = []
+        for rule in self.rules:
+            value, error = rule.check(form_data)
+            responses[rule.name] = value
+            if error:
+                errors.append(error)
+        return responses, errors